@@ -0,0 +1,101 @@
+# Agregados dos dashboards, mantidos incrementalmente
+#
+# As contagens por Status, Responsável, Tipo Ação e situação de prazo são
+# calculadas uma vez por snapshot e, a cada gravação, atualizadas apenas com as
+# linhas alteradas (subtrai a versão antiga, soma a nova). Nenhum rerun precisa
+# varrer o plano inteiro.
+import numpy as np
+import pandas as pd
+
+# Situação de prazo, derivada de Término Previsto / Término Real e da data de hoje
+ENCERRADA = "Encerrada"
+VENCIDA = "Vencida"
+VENCE_EM_BREVE = "Vence em breve"
+NO_PRAZO = "No prazo"
+SEM_PRAZO = "Sem prazo"
+PRAZO_OPTIONS = [ENCERRADA, VENCIDA, VENCE_EM_BREVE, NO_PRAZO, SEM_PRAZO]
+
+# Status que encerram a tarefa mesmo sem Término Real
+STATUS_ENCERRADOS = ["Concluída", "Cancelada"]
+
+# Quantos dias antes do Término Previsto a tarefa passa a "vencer em breve"
+DIAS_ALERTA = 7
+
+AGREGADO_COLUMNS = ["Status", "Responsável", "Tipo Ação"]
+
+def situacao_prazo(df, hoje, dias_alerta=DIAS_ALERTA):
+    # Uma única passada vetorizada sobre as colunas de datas
+    hoje = pd.Timestamp(hoje).normalize()
+    previsto = df["Término Previsto"]
+    encerrada = (df["Término Real"].notna() | df["Status"].isin(STATUS_ENCERRADOS)).to_numpy(dtype=bool)
+    sem_prazo = previsto.isna().to_numpy(dtype=bool)
+    vencida = (previsto < hoje).to_numpy(dtype=bool)
+    em_breve = (previsto <= hoje + pd.Timedelta(days=dias_alerta)).to_numpy(dtype=bool)
+    codes = np.select([encerrada, sem_prazo, vencida, em_breve], [0, 4, 1, 2], default=3).astype(np.int8)
+    return pd.Categorical.from_codes(codes, categories=PRAZO_OPTIONS)
+
+class PlanoAgregados:
+    # Imutável: atualizado() retorna um novo objeto com as contagens ajustadas
+    def __init__(self, contagens, hoje, dias_alerta=DIAS_ALERTA):
+        self.contagens = contagens
+        self.hoje = hoje
+        self.dias_alerta = dias_alerta
+
+    @classmethod
+    def calcular(cls, df, hoje, dias_alerta=DIAS_ALERTA):
+        return cls(cls._contar(df, hoje, dias_alerta), hoje, dias_alerta)
+
+    @staticmethod
+    def _contar(df, hoje, dias_alerta):
+        # Contagens (sem vazios e sem valores zerados) de cada agregado de df
+        prazo = pd.Series(situacao_prazo(df, hoje, dias_alerta), index=df.index)
+        contagens = {col: df[col].value_counts(sort=False) for col in AGREGADO_COLUMNS}
+        contagens["Prazo"] = prazo.value_counts(sort=False)
+        contagens["Responsável x Prazo"] = df.groupby([df["Responsável"], prazo], observed=True).size()
+        return {chave: _sem_categorias(serie[serie > 0]) for chave, serie in contagens.items()}
+
+    def atualizado(self, removidas, adicionadas):
+        # removidas/adicionadas: linhas antigas e novas (frames pequenos)
+        if removidas is None or removidas.empty:
+            menos = {}
+        else:
+            menos = self._contar(removidas, self.hoje, self.dias_alerta)
+        if adicionadas is None or adicionadas.empty:
+            mais = {}
+        else:
+            mais = self._contar(adicionadas, self.hoje, self.dias_alerta)
+        contagens = {}
+        for chave, serie in self.contagens.items():
+            if chave in menos:
+                serie = _somar(serie, menos[chave], -1)
+            if chave in mais:
+                serie = _somar(serie, mais[chave], 1)
+            contagens[chave] = serie
+        return PlanoAgregados(contagens, self.hoje, self.dias_alerta)
+
+    def contagem(self, chave, ordem=None):
+        # Contagem de um agregado, ordenada pela quantidade (ou pela ordem dada)
+        serie = self.contagens[chave]
+        if ordem is not None:
+            return serie.reindex([valor for valor in ordem if valor in serie.index])
+        return serie.sort_values(ascending=False, kind='stable')
+
+    def vencidas_por_responsavel(self):
+        cruzado = self.contagens["Responsável x Prazo"]
+        if cruzado.empty:
+            return pd.Series(dtype='int64')
+        vencidas = cruzado[cruzado.index.get_level_values(1) == VENCIDA]
+        return vencidas.droplevel(1).sort_values(ascending=False, kind='stable')
+
+def _sem_categorias(serie):
+    # Índices categóricos de frames diferentes não se alinham: usa os rótulos
+    indice = serie.index
+    if isinstance(indice, pd.MultiIndex):
+        indice = pd.MultiIndex.from_arrays([indice.get_level_values(i).astype(object) for i in range(indice.nlevels)])
+    else:
+        indice = indice.astype(object)
+    return pd.Series(serie.to_numpy(dtype='int64'), index=indice)
+
+def _somar(serie, delta, sinal):
+    resultado = serie.add(delta * sinal, fill_value=0).astype('int64')
+    return resultado[resultado > 0]
@@ -0,0 +1,257 @@
+# Benchmarks do plano de ação
+#
+#   $ python benchmark.py                          # conversão de tipos, 10k/100k/500k linhas
+#   $ python benchmark.py --rows 1000 50000
+#   $ python benchmark.py --suite pipeline         # etapas do app, 1k a 500k linhas
+#   $ python benchmark.py --suite pipeline --json resultados.json
+#
+# A suíte "coerce" compara a conversão antiga (loop por coluna com inferência de
+# formato e .apply por elemento) com o PlanoSchema compilado.
+#
+# A suíte "pipeline" mede cada etapa do app separadamente (leitura da planilha,
+# conversão, preparo do editor, diff, filtro por responsável e gravação) contra
+# um FakeWorksheet local, com o caminho antigo ao lado do atual. Para cada etapa
+# informa tempo (melhor de --repeat), pico de memória alocada (tracemalloc),
+# chamadas à API do Sheets e bytes enviados. Com --json os resultados são
+# gravados para comparar execuções e achar regressões.
+import argparse
+import json
+import time
+import tracemalloc
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from agregados import situacao_prazo
+from schema import expected_dtypes, plano_schema, ACAO_ETAPA_OPTIONS, TIPO_ACAO_OPTIONS, STATUS_OPTIONS
+from snapshot import SessionOverlay
+from storage import CachedStorage, FakeWorksheet, GoogleSheetsStorage, changed_cells, changed_cells_in_rows
+
+# dtypes anteriores ao schema categórico (todas as colunas de texto como 'str')
+legacy_dtypes = {col: 'str' if str(dtype) == 'category' else dtype for col, dtype in expected_dtypes.items()}
+
+def gerar_plano_texto(n_rows, seed=0):
+    # Plano sintético no formato lido da planilha (tudo texto, datas DD/MM/YYYY)
+    rng = np.random.default_rng(seed)
+    base = np.datetime64('2025-01-01')
+
+    def datas(fraction_empty):
+        dias = rng.integers(0, 365, n_rows)
+        valores = pd.Series(base + dias.astype('timedelta64[D]')).dt.strftime('%d/%m/%Y').to_numpy(dtype=object)
+        valores[rng.random(n_rows) < fraction_empty] = ''
+        return valores
+
+    responsaveis = np.array([f"Responsável {i:02d}" for i in range(40)], dtype=object)
+    return pd.DataFrame({
+        "Nº Sequência": np.arange(1, n_rows + 1).astype(str),
+        "Data Fato": datas(0.0),
+        "Responsável": responsaveis[rng.integers(0, len(responsaveis), n_rows)],
+        "Descreva sua tarefa": np.char.add("Tarefa ", np.arange(n_rows).astype(str)).astype(object),
+        "Ação/Etapa": np.array(ACAO_ETAPA_OPTIONS, dtype=object)[rng.integers(0, 2, n_rows)],
+        "Tipo Ação": np.array(TIPO_ACAO_OPTIONS, dtype=object)[rng.integers(0, 3, n_rows)],
+        "Início Previsto": datas(0.3),
+        "Término Previsto": datas(0.3),
+        "Início Real": datas(0.6),
+        "Término Real": datas(0.8),
+        "Status": np.array(STATUS_OPTIONS, dtype=object)[rng.integers(0, len(STATUS_OPTIONS), n_rows)],
+        "Observação": np.where(rng.random(n_rows) < 0.5, "", "Observação").astype(object),
+        "Versão": np.full(n_rows, "1", dtype=object),
+    }).replace({'': np.nan})
+
+# --- Implementação anterior, mantida apenas como referência de comparação ---
+
+def legacy_coerce(df):
+    for col, dtype in legacy_dtypes.items():
+        if col in df.columns:
+            if 'datetime' in str(dtype):
+                df[col] = pd.to_datetime(df[col], errors='coerce', dayfirst=True)
+            elif 'Int64' in str(dtype):
+                df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int64')
+            else:
+                df[col] = df[col].astype(dtype)
+    return df
+
+def legacy_format(df):
+    df_for_gsheets = df.copy()
+    for col in df_for_gsheets.select_dtypes(include=['datetime64[ns]']).columns:
+        df_for_gsheets[col] = df_for_gsheets[col].dt.strftime('%d/%m/%Y').replace({pd.NA: ''})
+    for col in df_for_gsheets.select_dtypes(include=['Int64']).columns:
+        df_for_gsheets[col] = df_for_gsheets[col].apply(lambda x: int(x) if pd.notna(x) else '')
+    return df_for_gsheets.fillna('')
+
+def memoria_mb(df):
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+def medir(func, *args, repeat=3):
+    # Melhor tempo de `repeat` execuções, em segundos
+    melhor = float('inf')
+    for _ in range(repeat):
+        inicio = time.perf_counter()
+        func(*args)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+def bench_coerce(n_rows, repeat=3):
+    texto = gerar_plano_texto(n_rows)
+    tipado = plano_schema.coerce(texto.copy())
+    legado = legacy_coerce(texto.copy())
+    return {
+        "memória MB (antigo)": memoria_mb(legado),
+        "memória MB (schema)": memoria_mb(tipado),
+        "value_counts Status (antigo)": medir(lambda: legado["Status"].astype(str).value_counts(), repeat=repeat),
+        "value_counts Status (schema)": medir(lambda: tipado["Status"].value_counts(), repeat=repeat),
+        "coerce (antigo)": medir(lambda: legacy_coerce(texto.copy()), repeat=repeat),
+        "coerce (schema)": medir(lambda: plano_schema.coerce(texto.copy()), repeat=repeat),
+        "coerce já tipado (schema)": medir(lambda: plano_schema.coerce(tipado.copy()), repeat=repeat),
+        "format (antigo)": medir(lambda: legacy_format(tipado), repeat=repeat),
+        "format (schema)": medir(lambda: plano_schema.format_for_gsheets(tipado), repeat=repeat),
+    }
+
+# --- Suíte "pipeline": etapas do app contra um FakeWorksheet ---
+
+EDITOR_PAGE_SIZE = 50
+
+def planilha_sintetica(n_rows, seed=0):
+    # FakeWorksheet com cabeçalho na linha 1 e o plano sintético como texto
+    texto = gerar_plano_texto(n_rows, seed).fillna('')
+    return FakeWorksheet([list(texto.columns)] + texto.to_numpy().tolist())
+
+def legacy_editor_prep(df):
+    # Preparo antigo do editor: cópia do plano inteiro com strftime em cada data
+    df_display = df.sort_values(by="Nº Sequência", ascending=True).copy()
+    for col in plano_schema.date_columns:
+        df_display[col] = df_display[col].dt.strftime('%d/%m/%Y').replace({pd.NA: ''})
+    return df_display
+
+def legacy_filtro_responsavel(df, nome):
+    # Filtro antigo por responsável e a concatenação com o restante ao salvar
+    filtrado = df[df["Responsável"].astype(str) == nome].copy()
+    return pd.concat([df[df["Responsável"].astype(str) != nome], filtrado], ignore_index=True)
+
+def legacy_save(worksheet, df):
+    # Gravação antiga: reescreve a planilha inteira a cada save
+    valores = legacy_format(df)
+    worksheet.update([list(valores.columns)] + valores.to_numpy().tolist(), range_name="A1")
+
+def medir_etapa(func, repeat=3, worksheet=None):
+    # Tempo (melhor de `repeat`), pico de memória e chamadas/bytes de uma execução
+    chamadas_antes = sum(worksheet.calls.values()) if worksheet is not None else 0
+    bytes_antes = worksheet.bytes_sent if worksheet is not None else 0
+    tracemalloc.start()
+    func(0)
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    resultado = {
+        "ms": None,
+        "pico_mb": pico / 1024 ** 2,
+        "chamadas_api": sum(worksheet.calls.values()) - chamadas_antes if worksheet is not None else 0,
+        "bytes_enviados": worksheet.bytes_sent - bytes_antes if worksheet is not None else 0,
+    }
+    melhor = float('inf')
+    for i in range(1, repeat + 1):
+        inicio = time.perf_counter()
+        func(i)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    resultado["ms"] = melhor * 1000
+    return resultado
+
+def bench_pipeline(n_rows, repeat=3, n_edits=10):
+    # Retorna {(etapa, variante): medidas}
+    resultados = {}
+    worksheet = planilha_sintetica(n_rows)
+    texto = gerar_plano_texto(n_rows)
+
+    resultados[("load", "planilha -> DataFrame")] = medir_etapa(
+        lambda i: GoogleSheetsStorage(lambda: worksheet).load(), repeat, worksheet)
+    resultados[("coerce", "antigo")] = medir_etapa(lambda i: legacy_coerce(texto.copy()), repeat)
+    resultados[("coerce", "schema")] = medir_etapa(lambda i: plano_schema.coerce(texto.copy()), repeat)
+
+    storage = CachedStorage(GoogleSheetsStorage(lambda: worksheet), check_interval=0)
+    plano = storage.snapshot()
+    df = plano.df
+    overlay = SessionOverlay()
+    pagina = np.arange(min(EDITOR_PAGE_SIZE, n_rows))
+
+    def editor_prep(i):
+        frame = overlay.frame(plano, pagina)
+        frame["Prazo"] = situacao_prazo(frame, date.today())
+        return frame
+    resultados[("editor prep", "antigo (plano inteiro)")] = medir_etapa(lambda i: legacy_editor_prep(df), repeat)
+    resultados[("editor prep", "página + overlay")] = medir_etapa(editor_prep, repeat)
+
+    rng = np.random.default_rng(1)
+    linhas = np.sort(rng.choice(n_rows, size=min(n_edits, n_rows), replace=False))
+    editado = df.copy()
+    editado.iloc[linhas, editado.columns.get_loc("Observação")] = "editado"
+    snapshot = plano_schema.format_for_gsheets(df)
+    resultados[("diff", "antigo (equals)")] = medir_etapa(lambda i: editado.equals(df), repeat)
+    resultados[("diff", "changed_cells (plano inteiro)")] = medir_etapa(
+        lambda i: changed_cells(plano_schema.format_for_gsheets(editado), snapshot), repeat)
+    resultados[("diff", "changed_cells_in_rows")] = medir_etapa(
+        lambda i: changed_cells_in_rows(editado, linhas, snapshot), repeat)
+
+    nome = str(df["Responsável"].iat[0])
+    plano.indice  # o índice é compartilhado e calculado uma vez por snapshot
+    resultados[("filtro responsável", "antigo (máscara + concat)")] = medir_etapa(
+        lambda i: legacy_filtro_responsavel(df, nome), repeat)
+    resultados[("filtro responsável", "índice")] = medir_etapa(
+        lambda i: plano.frame(plano.indice.posicoes_responsavel(nome)), repeat)
+
+    seqs = df["Nº Sequência"].to_numpy()[linhas]
+    # Cada repetição grava um valor diferente, para que sempre haja o que gravar.
+    # O save antigo vem depois porque muda a planilha e invalidaria o cache.
+    resultados[("save", f"save_cells ({len(linhas)} células)")] = medir_etapa(
+        lambda i: storage.save_cells({int(seq): {"Observação": f"edição {i}"} for seq in seqs}), repeat, worksheet)
+    resultados[("save", "antigo (reescreve tudo)")] = medir_etapa(lambda i: legacy_save(worksheet, df), repeat, worksheet)
+
+    # Releitura depois que outra sessão gravou n_edits linhas: a planilha inteira
+    # ou só o Nº Sequência/Versão e as linhas alteradas (load_changes)
+    leitor = GoogleSheetsStorage(lambda: worksheet)
+    _, anterior = leitor.load()
+    CachedStorage(GoogleSheetsStorage(lambda: worksheet)).save_cells(
+        {int(seq): {"Observação": "outra sessão"} for seq in seqs})
+    resultados[("reload", "completo")] = medir_etapa(lambda i: leitor.load(), repeat, worksheet)
+    resultados[("reload", f"incremental ({len(seqs)} linhas)")] = medir_etapa(
+        lambda i: leitor.load_changes(anterior), repeat, worksheet)
+
+    return resultados
+
+def imprimir_pipeline(n_rows, resultados):
+    print(f"\n{n_rows:,} linhas")
+    print(f"  {'etapa':<20} {'variante':<32} {'ms':>10} {'pico MB':>9} {'API':>5} {'bytes':>12}")
+    for (etapa, variante), medidas in resultados.items():
+        print(f"  {etapa:<20} {variante:<32} {medidas['ms']:10.1f} {medidas['pico_mb']:9.1f} "
+              f"{medidas['chamadas_api']:5d} {medidas['bytes_enviados']:12,d}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do plano de ação")
+    parser.add_argument("--suite", choices=["coerce", "pipeline"], default="coerce")
+    parser.add_argument("--rows", type=int, nargs="+")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--edits", type=int, default=10, help="células editadas nas etapas de diff e save")
+    parser.add_argument("--json", help="grava os resultados da suíte pipeline neste arquivo")
+    args = parser.parse_args()
+
+    if args.suite == "pipeline":
+        todos = []
+        for n_rows in args.rows or [1_000, 10_000, 100_000, 500_000]:
+            resultados = bench_pipeline(n_rows, args.repeat, args.edits)
+            imprimir_pipeline(n_rows, resultados)
+            todos.extend({"linhas": n_rows, "etapa": etapa, "variante": variante, **medidas}
+                         for (etapa, variante), medidas in resultados.items())
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(todos, f, ensure_ascii=False, indent=2)
+        return
+
+    for n_rows in args.rows or [10_000, 100_000, 500_000]:
+        print(f"\n{n_rows:,} linhas")
+        for etapa, valor in bench_coerce(n_rows, args.repeat).items():
+            if etapa.startswith("memória"):
+                print(f"  {etapa:<30} {valor:10.1f}")
+            else:
+                print(f"  {etapa:<30} {valor * 1000:10.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# Raiz do repositório no sys.path, para os testes em tests/ importarem os módulos do app
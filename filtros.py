@@ -0,0 +1,82 @@
+# Filtros e paginação do plano de ação, avaliados no servidor
+#
+# Os filtros viram máscaras booleanas vetorizadas sobre o plano e o resultado
+# é uma lista de posições (em ordem de Nº Sequência). Só as linhas da página
+# atual são copiadas para o frame enviado ao st.data_editor.
+import math
+
+import numpy as np
+import pandas as pd
+
+TEXTO_COLUMNS = ["Descreva sua tarefa", "Observação"]
+
+def normalizar_texto(serie):
+    # Minúsculas e sem acentos, para "concluida" encontrar "Concluída"
+    return (
+        serie.fillna('').astype(str).str.lower()
+        .str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+    )
+
+def indice_texto(df):
+    # Texto pesquisável de cada linha, calculado uma vez por versão dos dados
+    texto = normalizar_texto(df[TEXTO_COLUMNS[0]])
+    for col in TEXTO_COLUMNS[1:]:
+        texto = texto + '\n' + normalizar_texto(df[col])
+    return texto.reset_index(drop=True)
+
+class PlanoFiltro:
+    # Critérios do filtro; vazio/None em um critério significa "não filtrar"
+    def __init__(self, status=(), tipos=(), coluna_data=None, inicio=None, fim=None, texto=""):
+        self.status = tuple(status)
+        self.tipos = tuple(tipos)
+        self.coluna_data = coluna_data
+        self.inicio = inicio
+        self.fim = fim
+        self.texto = texto.strip()
+
+    def chave(self):
+        # Identifica o filtro nos caches de frames e nas chaves dos editores
+        return (self.status, self.tipos, self.coluna_data, self.inicio, self.fim, self.texto)
+
+    def ativo(self):
+        return bool(self.status or self.tipos or self.texto or (self.coluna_data and (self.inicio or self.fim)))
+
+    def mascara(self, df, texto=None):
+        # texto: resultado de indice_texto(df), para não normalizar a cada busca
+        mascara = np.ones(len(df), dtype=bool)
+        if self.status:
+            mascara &= df["Status"].isin(self.status).to_numpy()
+        if self.tipos:
+            mascara &= df["Tipo Ação"].isin(self.tipos).to_numpy()
+        if self.coluna_data and (self.inicio or self.fim):
+            datas = df[self.coluna_data]
+            if self.inicio:
+                mascara &= (datas >= pd.Timestamp(self.inicio)).fillna(False).to_numpy(dtype=bool)
+            if self.fim:
+                mascara &= (datas <= pd.Timestamp(self.fim)).fillna(False).to_numpy(dtype=bool)
+        if self.texto:
+            if texto is None:
+                texto = indice_texto(df)
+            # Todos os termos precisam aparecer (em qualquer das colunas de texto)
+            for termo in normalizar_texto(pd.Series(self.texto.split())):
+                mascara &= texto.str.contains(termo, regex=False).to_numpy(dtype=bool)
+        return mascara
+
+    def posicoes(self, df, posicoes=None, texto=None):
+        # Posições de df que passam no filtro. posicoes: subconjunto de partida
+        # (ex.: as tarefas de um responsável); None = todas, em ordem de Nº Sequência.
+        if posicoes is None:
+            seqs = df["Nº Sequência"]
+            posicoes = np.arange(len(df)) if seqs.is_monotonic_increasing else np.argsort(seqs.to_numpy(dtype='float64', na_value=np.nan), kind='stable')
+        posicoes = np.asarray(posicoes, dtype=np.intp)
+        if not self.ativo():
+            return posicoes
+        return posicoes[self.mascara(df, texto)[posicoes]]
+
+def total_paginas(n_linhas, tamanho):
+    return max(1, math.ceil(n_linhas / tamanho))
+
+def pagina(posicoes, numero, tamanho):
+    # Fatia das posições exibida na página `numero` (a partir de 1)
+    inicio = (numero - 1) * tamanho
+    return posicoes[inicio:inicio + tamanho]
@@ -0,0 +1,111 @@
+# Índices do plano de ação, mantidos incrementalmente
+#
+# Cada PlanoSnapshot tem o seu PlanoIndex; a versão seguinte do plano recebe uma
+# cópia atualizada só com as linhas alteradas e as novas (ver atualizado).
+import copy
+
+import numpy as np
+import pandas as pd
+
+from schema import plano_schema
+
+def posicoes_por_seq(seqs_index, seqs):
+    # Posições em seqs_index (pd.Index de Nº Sequência) dos números pedidos, -1
+    # se não existir. A planilha pode ter números repetidos (numeração antiga,
+    # edição direta): nesse caso vale a primeira ocorrência.
+    procurados = pd.Index(seqs, dtype='Int64')
+    if seqs_index.is_unique:
+        return seqs_index.get_indexer(procurados)
+    primeiras = ~seqs_index.duplicated(keep='first')
+    posicoes = seqs_index[primeiras].get_indexer(procurados)
+    return np.where(posicoes >= 0, np.flatnonzero(primeiras)[posicoes], -1)
+
+class PlanoIndex:
+    # Mapeia Nº Sequência -> posição no plano e Responsável -> posições das
+    # suas tarefas (em ordem de Nº Sequência). Consultas e atualizações custam
+    # proporcional ao número de linhas envolvidas, não ao tamanho do plano.
+    def __init__(self, df):
+        self._n_rows = 0
+        self._seqs = pd.Index([], dtype='Int64')
+        self._por_responsavel = {}
+        self.adicionar(df)
+
+    def __len__(self):
+        return self._n_rows
+
+    def adicionar(self, df_novos):
+        # Registra linhas acrescentadas no final do plano
+        if df_novos.empty:
+            return
+        inicio = self._n_rows
+        self._seqs = self._seqs.append(pd.Index(df_novos["Nº Sequência"].astype('Int64')))
+        self._n_rows += len(df_novos)
+
+        posicoes = np.arange(inicio, inicio + len(df_novos))
+        # Nº Sequência vazio vira NaN (fica no fim da ordenação)
+        seqs = df_novos["Nº Sequência"].to_numpy(dtype='float64', na_value=np.nan)
+        # Agrupa pelos códigos inteiros da categórica (ou do factorize)
+        responsaveis = df_novos["Responsável"]
+        if isinstance(responsaveis.dtype, pd.CategoricalDtype):
+            codes, nomes = responsaveis.cat.codes.to_numpy(), responsaveis.cat.categories
+        else:
+            codes, nomes = pd.factorize(responsaveis)
+        grupos = pd.Series(posicoes).groupby(codes).indices
+        for code, locais in grupos.items():
+            if code < 0:
+                continue
+            nome = nomes[code]
+            novas = posicoes[locais]
+            if not pd.Series(seqs[locais]).is_monotonic_increasing:
+                novas = novas[np.argsort(seqs[locais], kind='stable')]
+            existentes = self._por_responsavel.get(nome)
+            self._por_responsavel[nome] = novas if existentes is None else np.concatenate([existentes, novas])
+
+    def posicoes(self, seqs):
+        # Posições das linhas com esses Nº Sequência (-1 se não existir)
+        return posicoes_por_seq(self._seqs, seqs)
+
+    def atualizado(self, posicoes, antigas, atuais, novas):
+        # Novo índice para a próxima versão do plano: as linhas `posicoes` mudaram
+        # de antigas para atuais e `novas` foram acrescentadas no final. Este
+        # índice não é alterado (continua valendo para o snapshot anterior).
+        # Retorna None (recalcular do zero) se algum Nº Sequência mudou.
+        seqs_antigos = antigas["Nº Sequência"].to_numpy(dtype='float64', na_value=np.nan)
+        seqs_atuais = atuais["Nº Sequência"].to_numpy(dtype='float64', na_value=np.nan)
+        if not np.array_equal(seqs_antigos, seqs_atuais, equal_nan=True):
+            return None
+        # Os arrays de posições nunca são alterados no lugar: basta copiar o dicionário
+        indice = copy.copy(self)
+        indice._por_responsavel = dict(self._por_responsavel)
+        for posicao, antigo, novo in zip(posicoes, antigas["Responsável"], atuais["Responsável"]):
+            if not plano_schema.same_value(antigo, novo):
+                indice.mover_responsavel(posicao, antigo, novo)
+        indice.adicionar(novas)
+        return indice
+
+    def repetidos(self):
+        # Nº Sequência que aparecem em mais de uma linha (ambíguos para edição)
+        if self._seqs.is_unique:
+            return set()
+        return set(self._seqs[self._seqs.duplicated() & self._seqs.notna()].astype(int))
+
+    def posicoes_responsavel(self, nome):
+        return self._por_responsavel.get(nome, np.empty(0, dtype=np.intp))
+
+    def responsaveis(self):
+        return sorted(nome for nome, posicoes in self._por_responsavel.items() if len(posicoes))
+
+    def mover_responsavel(self, posicao, antigo, novo):
+        # Atualiza o índice quando o Responsável de uma linha muda
+        if not pd.isna(antigo) and antigo in self._por_responsavel:
+            atuais = self._por_responsavel[antigo]
+            self._por_responsavel[antigo] = atuais[atuais != posicao]
+        if not pd.isna(novo):
+            # Insere na ordem de Nº Sequência (empates e vazios pela posição, como em adicionar)
+            atuais = self._por_responsavel.get(novo, np.empty(0, dtype=np.intp))
+            seqs = self._seqs[atuais].to_numpy(dtype='float64', na_value=np.nan)
+            seq = self._seqs[posicao]
+            seq = np.nan if pd.isna(seq) else float(seq)
+            inicio, fim = np.searchsorted(seqs, seq, side='left'), np.searchsorted(seqs, seq, side='right')
+            i = inicio + np.searchsorted(atuais[inicio:fim], posicao)
+            self._por_responsavel[novo] = np.insert(atuais, i, posicao)
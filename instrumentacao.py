@@ -0,0 +1,200 @@
+# Instrumentação dos reruns: tempos por etapa, chamadas à API do Sheets e cache
+#
+# Cada rerun da sessão vira um RerunTrace com os spans medidos: etapas de nível
+# superior do script, marcadas em sequência (marcar), e trechos internos como
+# filtros, preparo do editor e st.data_editor (span), que ficam contidos na
+# etapa em que rodaram. Junto vão as chamadas à API feitas no thread do script
+# e os acertos/faltas do cache. Ao final do rerun o
+# trace é gravado como uma linha JSON no logger "plano.instrumentacao" e fica
+# disponível para o painel de debug. As chamadas feitas fora de um rerun (fila
+# de gravação) entram apenas nas estatísticas do processo (api_stats).
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger("plano.instrumentacao")
+
+# Métodos do gspread (Client, Spreadsheet e Worksheet) que fazem uma requisição
+API_METHODS = {
+    "open_by_id", "open_by_key", "worksheet", "get_lastUpdateTime",
+    "get_all_values", "get_values", "get", "batch_get",
+    "update", "batch_update", "batch_clear", "append_rows", "clear",
+}
+
+_local = threading.local()
+
+def _agora_ms(inicio):
+    return (time.perf_counter() - inicio) * 1000
+
+class ApiStats:
+    # Contagem e latência das chamadas à API, por método, no processo inteiro
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._por_metodo = {}
+
+    def registrar(self, metodo, ms, erro=False):
+        with self._lock:
+            stats = self._por_metodo.setdefault(metodo, {"chamadas": 0, "erros": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stats["chamadas"] += 1
+            stats["erros"] += int(erro)
+            stats["total_ms"] += ms
+            stats["max_ms"] = max(stats["max_ms"], ms)
+
+    def resumo(self):
+        with self._lock:
+            return {
+                metodo: dict(stats, media_ms=stats["total_ms"] / stats["chamadas"])
+                for metodo, stats in sorted(self._por_metodo.items())
+            }
+
+api_stats = ApiStats()
+
+class RerunTrace:
+    def __init__(self, sessao):
+        self.sessao = sessao
+        self.inicio_wall = time.time()
+        self._inicio = time.perf_counter()
+        self._ultimo_marco = self._inicio
+        self.spans = []
+        self.api = []
+        self.cache = {"hits": 0, "misses": 0}
+        self.duracao_ms = None
+        self.interrompido = False
+
+    def adicionar_span(self, nome, ms):
+        self.spans.append({"nome": nome, "ms": round(ms, 3)})
+
+    def marcar(self, nome):
+        # Span do marco anterior (ou do início do rerun) até agora
+        agora = time.perf_counter()
+        self.adicionar_span(nome, (agora - self._ultimo_marco) * 1000)
+        self._ultimo_marco = agora
+
+    def decorrido_ms(self):
+        return _agora_ms(self._inicio)
+
+    def registrar_api(self, metodo, ms, erro=False):
+        self.api.append({"metodo": metodo, "ms": round(ms, 3), "erro": erro})
+
+    def finalizar(self, interrompido=False):
+        self.duracao_ms = round(_agora_ms(self._inicio), 3)
+        self.interrompido = interrompido
+
+    def resumo(self):
+        return {
+            "evento": "rerun",
+            "sessao": self.sessao,
+            "inicio": self.inicio_wall,
+            "duracao_ms": self.duracao_ms,
+            "interrompido": self.interrompido,
+            "spans": self.spans,
+            "api_chamadas": len(self.api),
+            "api_ms": round(sum(chamada["ms"] for chamada in self.api), 3),
+            "api": self.api,
+            "cache": self.cache,
+        }
+
+class SessaoMetricas:
+    # Guardado na session_state. Um rerun interrompido por st.rerun() não chega ao
+    # finalizar(): é encerrado (como interrompido) no início do rerun seguinte.
+    # Os callbacks dos widgets rodam antes do script; os spans deles ficam
+    # pendentes e entram no trace do rerun que vem logo depois.
+    def __init__(self, sessao, historico=20):
+        self.sessao = sessao
+        self.atual = None
+        self.historico = deque(maxlen=historico)
+        self._pendentes = []
+
+    def iniciar(self):
+        if self.atual is not None and self.atual.duracao_ms is None:
+            self._encerrar(interrompido=True)
+        self.atual = RerunTrace(self.sessao)
+        for nome, ms in self._pendentes:
+            self.atual.adicionar_span(nome, ms)
+        self._pendentes = []
+        _local.trace = self.atual
+        return self.atual
+
+    def finalizar(self):
+        if self.atual is not None and self.atual.duracao_ms is None:
+            self._encerrar(interrompido=False)
+        _local.trace = None
+
+    def _encerrar(self, interrompido):
+        self.atual.finalizar(interrompido)
+        self.historico.append(self.atual)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(self.atual.resumo(), ensure_ascii=False, default=str))
+
+    @contextmanager
+    def span(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = _agora_ms(inicio)
+            if self.atual is not None and self.atual.duracao_ms is None:
+                self.atual.adicionar_span(nome, ms)
+            else:
+                self._pendentes.append((f"{nome} (callback)", ms))
+
+    def marcar(self, nome):
+        # Etapas de nível superior do script, medidas de marco a marco
+        if self.atual is not None and self.atual.duracao_ms is None:
+            self.atual.marcar(nome)
+
+    def registrar_cache(self, hits, misses):
+        if self.atual is not None:
+            self.atual.cache["hits"] += hits
+            self.atual.cache["misses"] += misses
+
+@contextmanager
+def api_call(metodo):
+    # Mede uma chamada à API: vai para api_stats e, se houver, para o rerun atual
+    inicio = time.perf_counter()
+    erro = False
+    try:
+        yield
+    except Exception:
+        erro = True
+        raise
+    finally:
+        ms = _agora_ms(inicio)
+        api_stats.registrar(metodo, ms, erro)
+        trace = getattr(_local, "trace", None)
+        if trace is not None:
+            trace.registrar_api(metodo, ms, erro)
+
+class InstrumentedProxy:
+    # Envolve um objeto do gspread (ou o FakeWorksheet) medindo os métodos de
+    # API_METHODS; os objetos retornados por eles e .spreadsheet também são envolvidos
+    def __init__(self, alvo):
+        self._alvo = alvo
+
+    def __getattr__(self, nome):
+        valor = getattr(self._alvo, nome)
+        if nome == "spreadsheet":
+            return InstrumentedProxy(valor)
+        if nome not in API_METHODS or not callable(valor):
+            return valor
+
+        def medido(*args, **kwargs):
+            with api_call(nome):
+                resultado = valor(*args, **kwargs)
+            if nome in ("open_by_id", "open_by_key", "worksheet"):
+                return InstrumentedProxy(resultado)
+            return resultado
+        return medido
+
+def configurar_log(destino):
+    # destino: caminho de arquivo, "-" para stderr ou vazio para não gravar
+    if not destino or logger.handlers:
+        return
+    handler = logging.StreamHandler() if destino == "-" else logging.FileHandler(destino, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
@@ -0,0 +1,186 @@
+# Fila de gravação em segundo plano (write-behind), uma por processo
+#
+# As edições chegam como {Nº Sequência: {coluna: valor}} e são mescladas por
+# planilha enquanto aguardam: várias edições seguidas da mesma célula viram uma
+# só escrita. Um worker grava cada lote depois de `debounce` segundos sem novas
+# edições (ou no máximo `max_delay` segundos depois da primeira) e, em erro de
+# cota (429), tenta de novo com backoff exponencial. Outros erros marcam o lote
+# como falho, guardando as edições para um reenvio manual.
+#
+# Junto com as edições vão as bases ({Nº Sequência: {"Versão": ..., coluna: valor
+# visto}}), usadas pelo storage para detectar edições concorrentes; os conflitos
+# que ele retorna ficam disponíveis em conflitos() até serem dispensados.
+import random
+import threading
+import time
+
+from storage import is_rate_limit_error
+
+PENDENTE = "pendente"
+SALVO = "salvo"
+FALHOU = "falhou"
+
+class _Pending:
+    def __init__(self, flush):
+        self.flush = flush
+        self.edits = {}
+        self.bases = {}
+        self.first_submit = None
+        self.last_submit = None
+        self.retry_at = None
+        self.attempts = 0
+
+    def merge(self, edits, newer=True, bases=None):
+        for seq, mudancas in edits.items():
+            atuais = self.edits.setdefault(seq, {})
+            if newer:
+                atuais.update(mudancas)
+            else:
+                # Edições mais antigas (lote que falhou) não sobrescrevem as novas
+                for col, valor in mudancas.items():
+                    atuais.setdefault(col, valor)
+        # Já a base que vale é sempre a mais antiga: o que o usuário viu antes
+        # da primeira edição ainda não gravada
+        for seq, base in (bases or {}).items():
+            atuais = self.bases.setdefault(seq, {})
+            if newer:
+                for col, valor in base.items():
+                    atuais.setdefault(col, valor)
+            else:
+                atuais.update(base)
+
+class SaveQueue:
+    def __init__(self, debounce=1.0, max_delay=5.0, base_backoff=1.0, max_backoff=60.0, max_attempts=6):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._in_flight = set()
+        self._failed = {}
+        self._status = {}
+        self._conflitos = {}
+        self._thread = None
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="save-queue", daemon=True)
+            self._thread.start()
+
+    def submit(self, sheet_key, edits, flush, bases=None):
+        # flush(edits, bases) grava um lote e retorna a lista de conflitos; é
+        # chamada no thread do worker
+        if not edits:
+            return
+        with self._cond:
+            pending = self._pending.get(sheet_key)
+            if pending is None:
+                pending = self._pending[sheet_key] = _Pending(flush)
+            pending.flush = flush
+            pending.merge(edits, bases=bases)
+            agora = time.monotonic()
+            pending.first_submit = pending.first_submit or agora
+            pending.last_submit = agora
+            self._status[sheet_key] = (PENDENTE, None)
+            self._ensure_worker()
+            self._cond.notify()
+
+    def retry_failed(self, sheet_key):
+        # Reenvia as edições de um lote que falhou, sem sobrescrever edições mais novas
+        with self._cond:
+            failed = self._failed.pop(sheet_key, None)
+            if failed is None:
+                return
+            pending = self._pending.get(sheet_key)
+            if pending is not None:
+                pending.merge(failed.edits, newer=False, bases=failed.bases)
+                return
+        self.submit(sheet_key, failed.edits, failed.flush, failed.bases)
+
+    def status(self, sheet_key):
+        # (estado, detalhe): estado é PENDENTE, SALVO, FALHOU ou None (nada enviado)
+        with self._cond:
+            if sheet_key in self._pending or sheet_key in self._in_flight:
+                return PENDENTE, self._status.get(sheet_key, (PENDENTE, None))[1]
+            return self._status.get(sheet_key, (None, None))
+
+    def conflitos(self, sheet_key):
+        with self._cond:
+            return list(self._conflitos.get(sheet_key, []))
+
+    def limpar_conflitos(self, sheet_key):
+        with self._cond:
+            self._conflitos.pop(sheet_key, None)
+
+    def wait(self, timeout=None):
+        # Espera até não haver gravações pendentes (usado em benchmarks e testes)
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._in_flight:
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return False
+                self._cond.wait(restante if restante is not None else 0.1)
+            return True
+
+    def _deadline(self, pending):
+        if pending.retry_at is not None:
+            return pending.retry_at
+        return min(pending.last_submit + self.debounce, pending.first_submit + self.max_delay)
+
+    def _next_batch(self):
+        # Bloqueia até algum lote estar pronto; retorna (sheet_key, pending)
+        with self._cond:
+            while True:
+                agora = time.monotonic()
+                prontos = [(self._deadline(p), key) for key, p in self._pending.items() if key not in self._in_flight]
+                if prontos:
+                    deadline, key = min(prontos)
+                    if deadline <= agora:
+                        self._in_flight.add(key)
+                        return key, self._pending.pop(key)
+                    self._cond.wait(deadline - agora)
+                else:
+                    self._cond.wait()
+
+    def _backoff(self, attempts):
+        atraso = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+        return atraso * (0.5 + random.random() / 2)
+
+    def _run(self):
+        while True:
+            sheet_key, pending = self._next_batch()
+            try:
+                conflitos = pending.flush(pending.edits, pending.bases)
+            except Exception as e:
+                pending.attempts += 1
+                with self._cond:
+                    self._in_flight.discard(sheet_key)
+                    # Junta o que chegou enquanto o lote estava sendo gravado
+                    atual = self._pending.pop(sheet_key, None)
+                    if atual is not None:
+                        atual.merge(pending.edits, newer=False, bases=pending.bases)
+                        pending.edits = atual.edits
+                        pending.bases = atual.bases
+                        pending.flush = atual.flush
+                    if is_rate_limit_error(e) and pending.attempts < self.max_attempts:
+                        pending.retry_at = time.monotonic() + self._backoff(pending.attempts)
+                        self._pending[sheet_key] = pending
+                        self._status[sheet_key] = (PENDENTE, "limite de requisições da API atingido, nova tentativa em instantes")
+                    else:
+                        # Mantém as edições para reenvio manual (retry_failed)
+                        pending.retry_at = None
+                        pending.attempts = 0
+                        self._failed[sheet_key] = pending
+                        self._status[sheet_key] = (FALHOU, str(e))
+                    self._cond.notify_all()
+            else:
+                with self._cond:
+                    self._in_flight.discard(sheet_key)
+                    if conflitos:
+                        self._conflitos.setdefault(sheet_key, []).extend(conflitos)
+                    if sheet_key not in self._pending:
+                        self._status[sheet_key] = (SALVO, None)
+                    self._cond.notify_all()
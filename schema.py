@@ -0,0 +1,220 @@
+# Estrutura do DataFrame do plano de ação e conversão de/para a planilha
+import numpy as np
+import pandas as pd
+from pandas.api import types as ptypes
+
+# Formato das datas na planilha e no app (DD/MM/YYYY)
+DATE_FORMAT = '%d/%m/%Y'
+
+# Opções fixas dos campos de seleção (formulário e SelectboxColumn)
+ACAO_ETAPA_OPTIONS = ["Ação", "Etapa"]
+TIPO_ACAO_OPTIONS = ["Ação de Melhoria", "Ação Imediata", "Ação Corretiva"]
+STATUS_OPTIONS = ["Sem Data", "Atrasada", "Planejada", "Cancelada", "Em Andamento", "Concluída"]
+
+# Definir a estrutura e os dtypes esperados para o DataFrame.
+# Colunas de poucos valores distintos são categóricas: as opções fixas vêm primeiro
+# e valores fora da lista (digitados direto na planilha) entram como categorias extras.
+expected_dtypes = {
+    "Nº Sequência": 'Int64',
+    "Data Fato": 'datetime64[ns]',
+    "Responsável": 'category',
+    "Descreva sua tarefa": 'str',
+    "Ação/Etapa": pd.CategoricalDtype(ACAO_ETAPA_OPTIONS),
+    "Tipo Ação": pd.CategoricalDtype(TIPO_ACAO_OPTIONS),
+    "Início Previsto": 'datetime64[ns]',
+    "Término Previsto": 'datetime64[ns]',
+    "Início Real": 'datetime64[ns]',
+    "Término Real": 'datetime64[ns]',
+    "Status": pd.CategoricalDtype(STATUS_OPTIONS),
+    "Observação": 'str',
+    # Versão da linha: incrementada a cada gravação, usada para detectar edições
+    # concorrentes (controle otimista). Não aparece no editor.
+    "Versão": 'Int64'
+}
+
+class PlanoSchema:
+    # Schema compilado uma única vez: separa as colunas por tipo e concentra a
+    # conversão de/para texto que antes estava repetida em cada tela.
+    def __init__(self, dtypes, date_format=DATE_FORMAT):
+        self.dtypes = dict(dtypes)
+        self.columns = list(self.dtypes.keys())
+        self.date_format = date_format
+        self.date_columns = [col for col, dtype in self.dtypes.items() if 'datetime' in str(dtype)]
+        self.int_columns = [col for col, dtype in self.dtypes.items() if str(dtype) == 'Int64']
+        self.str_columns = [col for col, dtype in self.dtypes.items() if str(dtype) == 'str']
+        # Categorias fixas de cada coluna categórica (lista vazia = só categorias dos dados)
+        self.categories = {
+            col: list(dtype.categories) if isinstance(dtype, pd.CategoricalDtype) and dtype.categories is not None else []
+            for col, dtype in self.dtypes.items() if str(dtype) == 'category'
+        }
+
+    def empty(self):
+        return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in self.dtypes.items()})
+
+    def _parse_dates(self, serie):
+        # Converte com formato explícito; só os textos fora do formato (ex.:
+        # "05/03/25", "01/02/2025 10:00", digitados direto na planilha) passam
+        # pela conversão tolerante com dayfirst, para não virarem vazio e serem
+        # apagados da planilha na próxima reescrita. Cada texto distinto é
+        # convertido uma única vez e o resultado é redistribuído pelos códigos.
+        codes, distintos = pd.factorize(serie)
+        textos = pd.Series(distintos, dtype=object)
+        datas_distintas = pd.to_datetime(textos, format=self.date_format, errors='coerce').astype('datetime64[ns]')
+        falhas = datas_distintas.isna() & (textos.astype(str).str.strip() != '')
+        if falhas.any():
+            datas_distintas[falhas] = pd.to_datetime(
+                textos[falhas], dayfirst=True, format='mixed', errors='coerce'
+            ).astype('datetime64[ns]')
+        datas_distintas = datas_distintas.to_numpy(dtype='datetime64[ns]')
+        datas = np.full(len(serie), np.datetime64('NaT'), dtype='datetime64[ns]')
+        validos = codes >= 0
+        datas[validos] = datas_distintas[codes[validos]]
+        return datas
+
+    def _merge_categories(self, col, *extras):
+        # Opções fixas primeiro, depois os demais valores em ordem alfabética
+        fixas = self.categories[col]
+        novas = set()
+        for valores in extras:
+            novas.update(str(valor) for valor in valores)
+        return fixas + sorted(novas.difference(fixas))
+
+    def _coerce_category(self, col, serie):
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            categorias = list(serie.cat.categories)
+            if categorias == self._merge_categories(col, categorias):
+                return serie
+            return serie.cat.set_categories(self._merge_categories(col, categorias))
+        # Códigos a partir do factorize: cada texto distinto é procurado nas
+        # categorias uma única vez (pd.Categorical(serie) procuraria linha a linha)
+        codes, distintos = pd.factorize(serie)
+        categorias = self._merge_categories(col, distintos)
+        mapa = pd.Index(categorias, dtype=object).get_indexer(pd.Index(distintos, dtype=object).astype(str))
+        codes = np.where(codes >= 0, mapa[np.maximum(codes, 0)] if len(mapa) else -1, -1)
+        return pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(categorias))
+
+    def missing_value(self, col):
+        if col in self.date_columns:
+            return pd.NaT
+        if col in self.int_columns:
+            return pd.NA
+        return np.nan
+
+    def from_editor(self, col, valor):
+        # Converte um valor de edited_rows do st.data_editor (JSON) para o tipo da coluna
+        if valor is None or (valor == '' and col not in self.str_columns):
+            return self.missing_value(col)
+        if col in self.date_columns:
+            try:
+                return pd.Timestamp(valor).normalize()
+            except (ValueError, TypeError):
+                return pd.NaT
+        if col in self.int_columns:
+            return int(valor)
+        return str(valor)
+
+    @staticmethod
+    def is_empty(valor):
+        # Na planilha não há diferença entre célula vazia e texto vazio
+        return pd.isna(valor) or (isinstance(valor, str) and valor == '')
+
+    @classmethod
+    def same_value(cls, atual, valor):
+        # Igualdade de células, com vazios (NaN/NaT/NA e '') considerados iguais entre si
+        if cls.is_empty(atual) or cls.is_empty(valor):
+            return cls.is_empty(atual) and cls.is_empty(valor)
+        return atual == valor
+
+    def set_value(self, df, row, col, valor):
+        # Grava o valor na posição `row` de df e retorna se ele mudou
+        if self.same_value(df[col].iat[row], valor):
+            return False
+        if col in self.categories and not pd.isna(valor) and valor not in df[col].cat.categories:
+            df[col] = df[col].cat.set_categories(self._merge_categories(col, df[col].cat.categories, [valor]))
+        df.iat[row, df.columns.get_loc(col)] = valor
+        return True
+
+    @staticmethod
+    def copy_columns(df, cols):
+        # Cópia rasa de df em que só as colunas `cols` são copiadas de fato: as
+        # escritas posicionais (set_value, set_rows) nessas colunas não alcançam
+        # o df original, com ou sem o Copy-on-Write do pandas (padrão só no 3.0)
+        copia = df.copy(deep=False)
+        for col in cols:
+            copia[col] = df[col].copy()
+        return copia
+
+    def set_rows(self, df, rows, novas):
+        # Substitui as linhas (posições) `rows` de df pelas de `novas`, uma
+        # atribuição por coluna; as categorias são unidas antes, como no concat
+        for col in self.columns:
+            valores = novas[col]
+            if col in self.categories:
+                categorias = self._merge_categories(col, df[col].cat.categories, valores.cat.categories)
+                if categorias != list(df[col].cat.categories):
+                    df[col] = df[col].cat.set_categories(categorias)
+                valores = valores.cat.set_categories(categorias)
+            df.iloc[rows, df.columns.get_loc(col)] = valores.array
+
+    def concat(self, frames):
+        # pd.concat de categóricas com categorias diferentes cairia para object:
+        # alinha as categorias antes (só remapeia os códigos inteiros)
+        frames = [frame for frame in frames if frame is not None]
+        for col in self.categories:
+            categorias = self._merge_categories(col, *(frame[col].cat.categories for frame in frames))
+            frames = [frame.assign(**{col: frame[col].cat.set_categories(categorias)}) for frame in frames]
+        return pd.concat(frames, ignore_index=True)
+
+    def _format_dates(self, serie):
+        # strftime apenas das datas distintas (um plano tem poucas datas diferentes)
+        codes, distintas = pd.factorize(serie)
+        textos = pd.DatetimeIndex(distintas).strftime(self.date_format).to_numpy(dtype=object)
+        valores = np.full(len(serie), '', dtype=object)
+        validos = codes >= 0
+        valores[validos] = textos[codes[validos]]
+        return valores
+
+    def coerce(self, df):
+        # Garante os dtypes esperados. Colunas que já estão no dtype certo não são
+        # tocadas, o que torna a chamada barata em reruns sem alteração.
+        for col in self.columns:
+            if col not in df.columns:
+                df[col] = pd.Series(dtype=self.dtypes[col], index=df.index)
+
+        for col in self.date_columns:
+            if not ptypes.is_datetime64_dtype(df[col]):
+                df[col] = self._parse_dates(df[col])
+
+        for col in self.int_columns:
+            if df[col].dtype != 'Int64':
+                try:
+                    df[col] = df[col].astype('Int64')
+                except (TypeError, ValueError):
+                    df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int64')
+
+        for col in self.str_columns:
+            if df[col].dtype != self.dtypes[col]:
+                texto = df[col].astype(self.dtypes[col])
+                if texto.dtype == object:
+                    # Antes do pandas 3, 'str' é object e astype transforma os
+                    # vazios no texto 'nan', que acabaria gravado na planilha
+                    texto = texto.where(df[col].notna(), np.nan)
+                df[col] = texto
+
+        for col in self.categories:
+            df[col] = self._coerce_category(col, df[col])
+
+        return df[self.columns]
+
+    def format_for_gsheets(self, df):
+        # Converte o DataFrame para os valores exatamente como são gravados na planilha
+        df_for_gsheets = pd.DataFrame(index=df.index)
+        for col in self.columns:
+            serie = df[col]
+            if col in self.date_columns:
+                df_for_gsheets[col] = self._format_dates(serie)
+            else:
+                df_for_gsheets[col] = serie.astype(object).where(serie.notna(), '')
+        return df_for_gsheets
+
+plano_schema = PlanoSchema(expected_dtypes)
@@ -0,0 +1,166 @@
+# Snapshot do plano compartilhado pelo processo e edições pendentes de cada sessão
+#
+# Cada versão do plano é um PlanoSnapshot imutável, criado pelo CachedStorage e
+# usado por todas as sessões do processo; os índices derivados (Nº Sequência,
+# Responsável, texto da busca) e os agregados são calculados uma única vez e,
+# nas versões seguintes, atualizados só com as linhas alteradas. Uma
+# sessão guarda apenas um SessionOverlay com as suas edições ainda não
+# gravadas, aplicado sobre o snapshot só nas linhas exibidas.
+import threading
+
+import numpy as np
+import pandas as pd
+
+from agregados import PlanoAgregados
+from filtros import indice_texto
+from indices import PlanoIndex
+from schema import plano_schema
+
+class PlanoSnapshot:
+    # df não deve ser alterado: novas versões são criadas com copy-on-write
+    # (ver CachedStorage), e quem tem uma referência continua vendo a sua versão
+    def __init__(self, df, versao):
+        self.df = df
+        self.versao = versao
+        self._lock = threading.Lock()
+        self._indice = None
+        self._texto = None
+        self._proximo_numero = None
+        self._agregados = None
+
+    @property
+    def empty(self):
+        return self.df.empty
+
+    @property
+    def indice(self):
+        with self._lock:
+            if self._indice is None:
+                self._indice = PlanoIndex(self.df)
+            return self._indice
+
+    @property
+    def texto(self):
+        # Texto normalizado de "Descreva sua tarefa" e "Observação" para a busca livre
+        with self._lock:
+            if self._texto is None:
+                self._texto = indice_texto(self.df)
+            return self._texto
+
+    @property
+    def proximo_numero(self):
+        with self._lock:
+            if self._proximo_numero is None:
+                maximo = self.df["Nº Sequência"].max()
+                self._proximo_numero = int(maximo) + 1 if pd.notna(maximo) else 1
+            return self._proximo_numero
+
+    def agregados(self, hoje):
+        # Contagens dos dashboards; a situação de prazo depende do dia, então um
+        # novo dia recalcula tudo uma vez
+        with self._lock:
+            if self._agregados is None or self._agregados.hoje != hoje:
+                self._agregados = PlanoAgregados.calcular(self.df, hoje)
+            return self._agregados
+
+    def herdar(self, anterior, posicoes, antigas):
+        # Deriva índices e agregados do snapshot anterior só com as linhas
+        # alteradas: `posicoes` mudaram no lugar (antigas = versão anterior
+        # delas) e as linhas além do tamanho do plano anterior são novas.
+        # O que o snapshot anterior ainda não calculou fica para ser calculado
+        # sob demanda.
+        atuais = self.df.iloc[posicoes]
+        novas = self.df.iloc[len(anterior.df):]
+        indice, texto, agregados = anterior._indice, anterior._texto, anterior._agregados
+        with self._lock:
+            if indice is not None:
+                self._indice = indice.atualizado(posicoes, antigas, atuais, novas)
+            if texto is not None:
+                texto = texto.copy()
+                if len(posicoes):
+                    texto.iloc[posicoes] = indice_texto(atuais).to_numpy()
+                self._texto = pd.concat([texto, indice_texto(novas)], ignore_index=True) if len(novas) else texto
+            if agregados is not None:
+                self._agregados = agregados.atualizado(antigas, atuais).atualizado(None, novas)
+
+    def frame(self, posicoes):
+        # Cópia apenas das linhas pedidas, na ordem pedida
+        return self.df.iloc[posicoes].reset_index(drop=True)
+
+class SessionOverlay:
+    # Edições da sessão ({Nº Sequência: {coluna: valor}}) enviadas para a fila de
+    # gravação e ainda não refletidas no snapshot. revisao muda a cada alteração.
+    def __init__(self):
+        self.edits = {}
+        self.revisao = 0
+
+    def __len__(self):
+        return len(self.edits)
+
+    def aplicar(self, edits):
+        for seq, mudancas in edits.items():
+            self.edits.setdefault(seq, {}).update(mudancas)
+        self.revisao += 1
+
+    def limpar(self):
+        if self.edits:
+            self.edits = {}
+            self.revisao += 1
+
+    def descartar_salvas(self, snapshot):
+        # Remove as células cujo valor o snapshot já tem (gravadas pela fila)
+        if not self.edits:
+            return
+        seqs = list(self.edits)
+        posicoes = snapshot.indice.posicoes(seqs)
+        mudou = False
+        for seq, linha in zip(seqs, posicoes):
+            mudancas = self.edits[seq]
+            for col in list(mudancas):
+                if linha < 0 or plano_schema.same_value(snapshot.df[col].iat[linha], mudancas[col]):
+                    del mudancas[col]
+                    mudou = True
+            if not mudancas:
+                del self.edits[seq]
+        if mudou:
+            self.revisao += 1
+
+    def posicoes(self, snapshot):
+        # Posições no snapshot das linhas com edições pendentes
+        posicoes = snapshot.indice.posicoes(list(self.edits))
+        return posicoes[posicoes >= 0]
+
+    def frame(self, snapshot, posicoes):
+        # Linhas do snapshot com as edições da sessão aplicadas (só a cópia da página)
+        frame = snapshot.frame(posicoes)
+        if self.edits and len(frame):
+            for i, seq in enumerate(frame["Nº Sequência"].to_numpy()):
+                # Linhas sem Nº Sequência não recebem edições (ver aplicar_edicoes_editor)
+                if pd.isna(seq):
+                    continue
+                for col, valor in self.edits.get(int(seq), {}).items():
+                    plano_schema.set_value(frame, i, col, valor)
+        return frame
+
+    def filtrar(self, snapshot, filtro, posicoes, base=None):
+        # Corrige o resultado de filtro.posicoes(snapshot.df) para as linhas
+        # editadas pela sessão, reavaliando o filtro só nessas linhas
+        if not self.edits or not filtro.ativo():
+            return posicoes
+        editadas = self.posicoes(snapshot)
+        if base is not None:
+            editadas = editadas[np.isin(editadas, base)]
+        if not len(editadas):
+            return posicoes
+        passam = filtro.mascara(self.frame(snapshot, editadas))
+        posicoes = np.union1d(np.setdiff1d(posicoes, editadas[~passam]), editadas[passam])
+        seqs = snapshot.df["Nº Sequência"].to_numpy(dtype='float64', na_value=np.nan)[posicoes]
+        return posicoes[np.argsort(seqs, kind='stable')]
+
+    def agregados(self, snapshot, hoje):
+        # Agregados do snapshot ajustados pelas edições pendentes da sessão
+        base = snapshot.agregados(hoje)
+        if not self.edits:
+            return base
+        editadas = self.posicoes(snapshot)
+        return base.atualizado(snapshot.frame(editadas), self.frame(snapshot, editadas))
@@ -0,0 +1,887 @@
+# Backends de armazenamento do plano de ação
+#
+# Todos os backends expõem a mesma interface usada pelo app:
+#   load()                   -> (df, snapshot)
+#   save(df, snapshot)       -> snapshot   (grava apenas as diferenças)
+#   save_rows(df, rows, snapshot) -> snapshot (idem, olhando só as linhas `rows`)
+#   append(df_novos, snapshot) -> snapshot (insere linhas no final)
+#   read_rows(rows, seqs)    -> DataFrame  (estado atual dessas linhas no backend)
+#   load_changes(snapshot)   -> (posições, alteradas, novas) ou None (ver changed_rows)
+#   version()                -> str        (muda sempre que os dados mudam)
+#   writes                   -> int        (requisições de escrita já enviadas)
+#
+# O snapshot é o DataFrame formatado (PlanoSchema.format_for_gsheets) do que está
+# gravado no backend. É ele que permite calcular o delta de cada save.
+#
+# CachedStorage envolve qualquer backend com um cache write-through por processo
+# e guarda o snapshot; o app só conversa com ele. O plano em cache é publicado
+# como PlanoSnapshot (snapshot.py), compartilhado por todas as sessões.
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from schema import expected_dtypes, plano_schema
+from snapshot import PlanoSnapshot
+
+# Linha do cabeçalho na planilha (set_with_dataframe escreve o cabeçalho na linha 1)
+# e primeira linha de dados correspondente.
+GSHEETS_HEADER_ROW = 1
+GSHEETS_FIRST_DATA_ROW = GSHEETS_HEADER_ROW + 1
+
+class StorageError(Exception):
+    pass
+
+def column_letter(col_idx):
+    # Converte o índice de coluna (0 = A) para a notação A1
+    letters = ""
+    col_idx += 1
+    while col_idx:
+        col_idx, remainder = divmod(col_idx - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+def cell_position(cell):
+    # Converte uma célula em notação A1 para (linha, coluna), começando em 1.
+    # Em ranges abertos ("A2:M", "1:1") a parte que falta volta como None.
+    letters = cell.rstrip('0123456789')
+    col = 0
+    for letter in letters:
+        col = col * 26 + ord(letter) - ord('A') + 1
+    digits = cell[len(letters):]
+    return int(digits) if digits else None, col or None
+
+def changed_cells(df_novo, df_anterior):
+    # Compara o DataFrame formatado com o snapshot e retorna a matriz booleana de
+    # células alteradas nas linhas já existentes.
+    # Retorna None quando é preciso reescrever tudo (schema diferente, linhas
+    # removidas ou ordem das linhas alterada).
+    if df_anterior is None or list(df_novo.columns) != list(df_anterior.columns):
+        return None
+    n_anterior = len(df_anterior)
+    if len(df_novo) < n_anterior:
+        return None
+
+    valores_novos = df_novo.to_numpy()[:n_anterior]
+    valores_anteriores = df_anterior.to_numpy()
+
+    if "Nº Sequência" in df_novo.columns:
+        seq_idx = df_novo.columns.get_loc("Nº Sequência")
+        if not np.array_equal(valores_novos[:, seq_idx], valores_anteriores[:, seq_idx]):
+            return None
+
+    return valores_novos != valores_anteriores
+
+def changed_cells_in_rows(df, rows, snapshot):
+    # Variante de changed_cells que formata e compara apenas as linhas (posições)
+    # indicadas. Retorna (valores formatados, matriz de células alteradas) ou None
+    # se as posições não correspondem ao snapshot.
+    if snapshot is None or len(df) != len(snapshot) or list(df.columns) != list(snapshot.columns):
+        return None
+    rows = np.asarray(rows, dtype=np.intp)
+    valores = plano_schema.format_for_gsheets(df.iloc[rows]).to_numpy()
+    valores_anteriores = snapshot.iloc[rows].to_numpy()
+    if "Nº Sequência" in df.columns:
+        seq_idx = df.columns.get_loc("Nº Sequência")
+        if not np.array_equal(valores[:, seq_idx], valores_anteriores[:, seq_idx]):
+            return None
+    return valores, valores != valores_anteriores
+
+def changed_rows(snapshot, seqs, versoes):
+    # Compara o Nº Sequência e a Versão de cada linha do backend (em ordem de
+    # posição, como texto) com o snapshot do último sync. Retorna (posições com
+    # Versão diferente, posições novas no final) ou None se alguma linha foi
+    # removida ou mudou de lugar (aí só uma releitura completa resolve).
+    n_anterior = len(snapshot)
+    if len(seqs) < n_anterior:
+        return None
+    seqs = np.asarray(seqs, dtype=object).astype(str)
+    versoes = np.asarray(versoes, dtype=object).astype(str)
+    if not np.array_equal(seqs[:n_anterior], snapshot["Nº Sequência"].to_numpy().astype(str)):
+        return None
+    alteradas = np.flatnonzero(versoes[:n_anterior] != snapshot["Versão"].to_numpy().astype(str))
+    return alteradas, np.arange(n_anterior, len(seqs))
+
+def _rows_to_plano(header, rows):
+    # Monta o DataFrame tipado a partir das linhas de texto lidas do backend
+    df = pd.DataFrame(rows, columns=header).replace({'': np.nan})
+    df = df.loc[:, [col for col in df.columns if col in expected_dtypes]]
+    return plano_schema.coerce(df)
+
+def _only_own_writes(antes, depois, escritas):
+    # Versões de contador (SQLite, FakeWorksheet) avançam uma unidade por
+    # escrita; qualquer outra diferença, ou versão que não é contador, não prova nada
+    if antes is None or depois is None or escritas is None:
+        return False
+    try:
+        return int(depois) - int(antes) == escritas
+    except ValueError:
+        return False
+
+# --- Cache write-through ---
+
+class CachedStorage:
+    # Mantém, por processo, o último DataFrame lido ou gravado, o snapshot do que
+    # está no backend e a versão correspondente. Um load só relê o backend
+    # quando version() mudou, e a versão é consultada no máximo a cada
+    # check_interval segundos. As gravações partem sempre desse estado e o
+    # atualizam com o que acabou de ser gravado (write-through).
+    #
+    # A releitura é incremental: o backend compara o Nº Sequência e a Versão de
+    # cada linha com o snapshot e devolve só as linhas novas ou alteradas, que
+    # são mescladas no cache. Uma alteração feita direto na planilha não muda a
+    # Versão da linha; por isso o plano inteiro é relido pelo menos a cada
+    # resync_interval segundos (e sempre que linhas somem ou mudam de lugar).
+    # Se a versão não puder ser consultada (o get_lastUpdateTime usa a API do
+    # Drive), o cache vale por resync_interval segundos desde a última leitura,
+    # como um TTL, em vez de reler o backend a cada consulta.
+    #
+    # Cada estado do cache é publicado como um PlanoSnapshot imutável: as gravações
+    # partem de uma cópia rasa do DataFrame atual em que só as colunas alteradas
+    # são copiadas (PlanoSchema.copy_columns), e quem já tem o snapshot anterior
+    # não é afetado.
+    #
+    # Interface usada pelo app:
+    #   snapshot()         -> PlanoSnapshot compartilhado (não alterar o df)
+    #   load()             -> cópia do DataFrame
+    #   save_cells(edits, bases) -> grava {Nº Sequência: {coluna: valor}} e
+    #                         retorna os conflitos (ver save_cells)
+    #   append(df_novos)   -> numera e insere linhas no final
+    #   save(df)           -> grava o DataFrame inteiro (apenas o delta)
+    def __init__(self, backend, check_interval=30, resync_interval=600):
+        self.backend = backend
+        self.check_interval = check_interval
+        self.resync_interval = resync_interval
+        self._lock = threading.RLock()
+        self._df = None
+        self._snapshot = None
+        self._version = None
+        self._plano = None
+        self._geracao = 0
+        self._checked_at = 0.0
+        self._full_sync_at = 0.0
+        self._synced_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def _backend_version(self):
+        try:
+            return self.backend.version()
+        except Exception:
+            return None
+
+    def invalidate(self):
+        with self._lock:
+            self._df = self._snapshot = self._version = self._plano = None
+
+    def _publish(self, df, posicoes=None, antigas=None):
+        # Nova versão do plano em cache (o df passa a ser somente leitura).
+        # posicoes/antigas: linhas alteradas no lugar e a versão anterior delas
+        # (as linhas além do plano anterior são novas), para os índices e
+        # agregados serem atualizados sem recalcular o plano inteiro
+        anterior = self._plano
+        self._df = df
+        self._geracao += 1
+        self._plano = PlanoSnapshot(df, self._geracao)
+        if anterior is not None and posicoes is not None:
+            self._plano.herdar(anterior, posicoes, antigas)
+
+    def _reload(self, version=None):
+        self.misses += 1
+        if version is None:
+            version = self._backend_version()
+        if not self._sync_changes():
+            df, self._snapshot = self.backend.load()
+            self._publish(df)
+            self._full_sync_at = time.monotonic()
+        self._version = version
+        self._checked_at = self._synced_at = time.monotonic()
+
+    def _stale(self, version):
+        # Cache desatualizado: a versão mudou ou, sem versão, o TTL expirou
+        if version is None:
+            return time.monotonic() - self._synced_at >= self.resync_interval
+        return version != self._version
+
+    def _sync_changes(self):
+        # Mescla no cache só as linhas novas ou alteradas desde o último sync.
+        # Retorna False quando é preciso reler o plano inteiro.
+        if self._df is None or self._snapshot is None:
+            return False
+        if time.monotonic() - self._full_sync_at >= self.resync_interval:
+            return False
+        mudancas = self.backend.load_changes(self._snapshot)
+        if mudancas is None:
+            return False
+        posicoes, alteradas, novas = mudancas
+        if not len(posicoes) and not len(novas):
+            return True
+
+        # Como em save_cells, o snapshot publicado continua intacto: set_rows
+        # escreve em todas as colunas, que são copiadas antes
+        df = plano_schema.copy_columns(self._df, plano_schema.columns if len(posicoes) else [])
+        snapshot = self._snapshot.copy()
+        if len(posicoes):
+            plano_schema.set_rows(df, posicoes, alteradas)
+            snapshot.iloc[posicoes] = plano_schema.format_for_gsheets(alteradas).to_numpy()
+        if len(novas):
+            df = plano_schema.concat([df, novas])
+            snapshot = pd.concat([snapshot, plano_schema.format_for_gsheets(novas)], ignore_index=True)
+        self._snapshot = snapshot
+        self._publish(df, posicoes, self._df.iloc[posicoes])
+        return True
+
+    def _ensure_current(self):
+        # Antes de gravar: garante que as posições do cache batem com o backend.
+        # Retorna a versão lida e o contador de escritas do backend, para
+        # _written conferir depois o que mudou
+        version = self._backend_version()
+        if self._df is None or self._stale(version):
+            self._reload(version)
+        return version, getattr(self.backend, 'writes', None)
+
+    def _written(self, antes):
+        # Depois de gravar: a nova versão só é adotada se mudou exatamente pelas
+        # nossas escritas. Se outro processo gravou no meio, ou não há como saber
+        # (o lastUpdateTime do Google Sheets é uma data, não um contador), o cache
+        # fica marcado como desatualizado e a próxima consulta faz a releitura
+        # incremental, em vez de absorver a alteração alheia por resync_interval.
+        versao_antes, escritas_antes = antes
+        depois = self._backend_version()
+        escritas = getattr(self.backend, 'writes', None)
+        proprias = None if escritas is None or escritas_antes is None else escritas - escritas_antes
+        self._version = depois if _only_own_writes(versao_antes, depois, proprias) else None
+        self._checked_at = time.monotonic()
+
+    def snapshot(self):
+        # O PlanoSnapshot publicado é imutável e é devolvido sem o lock: dentro do
+        # check_interval, ou enquanto outro thread está com o lock (a fila
+        # gravando, ou outra sessão relendo o backend), o rerun recebe o plano
+        # atual sem esperar pela API. O lock fica só para a checagem de versão
+        # e a releitura.
+        plano = self._plano
+        if plano is not None:
+            if time.monotonic() - self._checked_at < self.check_interval:
+                self.hits += 1
+                return plano
+            if not self._lock.acquire(blocking=False):
+                self.hits += 1
+                return plano
+        else:
+            self._lock.acquire()
+        try:
+            if self._plano is not None:
+                if time.monotonic() - self._checked_at < self.check_interval:
+                    self.hits += 1
+                    return self._plano
+                version = self._backend_version()
+                self._checked_at = time.monotonic()
+                if not self._stale(version):
+                    self.hits += 1
+                    return self._plano
+                self._reload(version)
+            else:
+                self._reload()
+            return self._plano
+        finally:
+            self._lock.release()
+
+    def load(self):
+        return self.snapshot().df.copy()
+
+    def _ler_linhas(self, seqs):
+        # Posições e estado atual no backend das linhas com esses Nº Sequência.
+        # Se as posições do cache não batem mais com o backend, relê tudo uma vez.
+        for tentativa in range(2):
+            posicoes = self._plano.indice.posicoes(seqs)
+            encontradas = posicoes >= 0
+            atuais = self.backend.read_rows(posicoes[encontradas], np.asarray(seqs, dtype=object)[encontradas])
+            if atuais is not None or tentativa:
+                return posicoes, atuais
+            self._reload()
+        return posicoes, None
+
+    def save_cells(self, edits, bases=None):
+        # Aplica as edições nas linhas localizadas pelo Nº Sequência e grava só
+        # essas linhas, incrementando a Versão de cada linha gravada.
+        #
+        # bases: {Nº Sequência: {"Versão": versão vista, coluna: valor visto}}.
+        # Com elas a gravação é otimista: as linhas são relidas do backend e, se
+        # a Versão mudou desde que o usuário as viu, uma célula só é gravada se
+        # ninguém mais a alterou (ou se já tem o mesmo valor). As demais voltam
+        # como conflitos: [{"Nº Sequência", "coluna", "seu valor", "valor atual"}]
+        # (coluna None = a tarefa não existe mais).
+        with self._lock:
+            antes = self._ensure_current()
+            seqs = list(edits.keys())
+            atuais = None
+            if bases is not None and self._snapshot is not None:
+                posicoes, atuais = self._ler_linhas(seqs)
+            else:
+                posicoes = self._plano.indice.posicoes(seqs)
+
+            # O snapshot publicado continua intacto: só as colunas que serão
+            # escritas (editadas, Versão e as que mudaram no backend) são copiadas
+            colunas = {"Versão"}.union(*(mudancas.keys() for mudancas in edits.values()))
+            if atuais is not None:
+                linhas = posicoes[posicoes >= 0]
+                for col in plano_schema.columns:
+                    if not all(map(plano_schema.same_value, self._df[col].iloc[linhas], atuais[col])):
+                        colunas.add(col)
+            df = plano_schema.copy_columns(self._df, colunas)
+            snapshot_anterior = self._snapshot
+            conflitos = []
+            rows = []
+            j = 0
+            for seq, linha in zip(seqs, posicoes):
+                if linha < 0:
+                    conflitos.append({"Nº Sequência": seq, "coluna": None, "seu valor": None, "valor atual": None})
+                    continue
+                base = (bases or {}).get(seq, {})
+                mudou_no_backend = False
+                if atuais is not None:
+                    remoto = atuais.iloc[j]
+                    j += 1
+                    # O cache (e o snapshot usado no diff) passam a refletir o backend
+                    for col in plano_schema.columns:
+                        plano_schema.set_value(df, linha, col, remoto[col])
+                    mudou_no_backend = "Versão" in base and not plano_schema.same_value(base["Versão"], remoto["Versão"])
+
+                gravou = False
+                for col, valor in edits[seq].items():
+                    atual = df[col].iat[linha]
+                    if (mudou_no_backend and col in base
+                            and not plano_schema.same_value(base[col], atual)
+                            and not plano_schema.same_value(valor, atual)):
+                        conflitos.append({"Nº Sequência": seq, "coluna": col, "seu valor": valor, "valor atual": atual})
+                        continue
+                    gravou |= plano_schema.set_value(df, linha, col, valor)
+                if gravou:
+                    versao = df["Versão"].iat[linha]
+                    plano_schema.set_value(df, linha, "Versão", 1 if pd.isna(versao) else int(versao) + 1)
+                rows.append(int(linha))
+
+            if rows:
+                linhas_antigas = self._df.iloc[rows]
+                try:
+                    if atuais is not None:
+                        # Diff contra o que está no backend agora: só as nossas células vão
+                        snapshot_anterior = snapshot_anterior.copy()
+                        snapshot_anterior.iloc[rows] = plano_schema.format_for_gsheets(atuais).to_numpy()
+                    self._snapshot = self.backend.save_rows(df, rows, snapshot_anterior)
+                except Exception:
+                    # Parte das linhas pode ter sido gravada: relê na próxima vez
+                    self.invalidate()
+                    raise
+                self._publish(df, rows, linhas_antigas)
+                self._written(antes)
+            return conflitos
+
+    def append(self, df_novos):
+        # Numera as linhas novas a partir do maior Nº Sequência do backend. A
+        # numeração acontece aqui, sob o lock e depois de _ensure_current, para
+        # duas sessões que adicionam tarefas ao mesmo tempo não usarem o mesmo
+        # número. Retorna as linhas gravadas, já numeradas.
+        with self._lock:
+            antes = self._ensure_current()
+            df_novos = df_novos.copy()
+            primeiro = self._plano.proximo_numero
+            df_novos["Nº Sequência"] = pd.array(range(primeiro, primeiro + len(df_novos)), dtype='Int64')
+            try:
+                self._snapshot = self.backend.append(df_novos, self._snapshot)
+            except Exception:
+                self.invalidate()
+                raise
+            self._publish(plano_schema.concat([self._df, df_novos]), np.empty(0, dtype=np.intp), self._df.iloc[:0])
+            self._written(antes)
+            return df_novos
+
+    def save(self, df):
+        with self._lock:
+            antes = self._ensure_current()
+            try:
+                self._snapshot = self.backend.save(df, self._snapshot)
+            except Exception:
+                self.invalidate()
+                raise
+            self._publish(df.copy())
+            self._written(antes)
+
+    def version(self):
+        return self.backend.version()
+
+def is_rate_limit_error(exc):
+    # gspread.exceptions.APIError (e o FakeWorksheet) expõem o código HTTP em .code
+    code = getattr(exc, 'code', None)
+    if code is None:
+        code = getattr(getattr(exc, 'response', None), 'status_code', None)
+    return code == 429
+
+# --- Google Sheets ---
+
+def _cell_updates(valores, alterado, positions):
+    # Células alteradas: um range por trecho contíguo de colunas alteradas em cada
+    # linha. Células não alteradas no meio não são reenviadas (seriam regravadas
+    # com o valor formatado, e um texto fora do formato viraria vazio).
+    # positions[i] é a posição (0 = primeira linha de dados) da linha valores[i].
+    updates = []
+    for i in np.flatnonzero(alterado.any(axis=1)):
+        cols = np.flatnonzero(alterado[i])
+        quebras = np.flatnonzero(np.diff(cols) > 1) + 1
+        sheet_row = GSHEETS_FIRST_DATA_ROW + int(positions[i])
+        for trecho in np.split(cols, quebras):
+            first_col, last_col = trecho[0], trecho[-1]
+            updates.append({
+                'range': f"{column_letter(first_col)}{sheet_row}:{column_letter(last_col)}{sheet_row}",
+                'values': [valores[i, first_col:last_col + 1].tolist()],
+            })
+    return updates
+
+class GoogleSheetsStorage:
+    # As leituras pedem só o range das colunas do schema (A até a Versão); a API
+    # já devolve apenas as linhas usadas dentro dele.
+    def __init__(self, open_worksheet):
+        # open_worksheet: função sem argumentos que retorna o gspread.Worksheet
+        # (ou um FakeWorksheet), ou None se o cliente não estiver autenticado
+        self._open_worksheet = open_worksheet
+        self.writes = 0
+        self._handle = None
+        self._handle_lock = threading.Lock()
+
+    def _worksheet(self):
+        # Abrir a planilha custa duas chamadas de metadados (open_by_id e
+        # worksheet): o Worksheet é aberto uma vez e reaproveitado (ver version)
+        with self._handle_lock:
+            if self._handle is None:
+                worksheet = self._open_worksheet()
+                if worksheet is None:
+                    raise StorageError("cliente Google Sheets não autenticado.")
+                self._handle = worksheet
+            return self._handle
+
+    def _schema_range(self, first_row, last_row=""):
+        return f"A{first_row}:{column_letter(len(plano_schema.columns) - 1)}{last_row}"
+
+    def _pad(self, row):
+        # A API omite as células vazias do final de cada linha
+        return list(row) + [''] * (len(plano_schema.columns) - len(row))
+
+    def _drop_handle(self):
+        with self._handle_lock:
+            self._handle = None
+
+    def load(self):
+        try:
+            return self._load()
+        except Exception:
+            # Aba renomeada ou removida, credencial trocada...: reabre na próxima vez
+            self._drop_handle()
+            raise
+
+    def _load(self):
+        worksheet = self._worksheet()
+        header, rows = worksheet.batch_get([
+            f"{GSHEETS_HEADER_ROW}:{GSHEETS_HEADER_ROW}",
+            self._schema_range(GSHEETS_FIRST_DATA_ROW),
+        ])
+        header = list(header[0]) if len(header) else []
+        if not header:
+            return plano_schema.empty(), None
+
+        if header[:len(plano_schema.columns)] == plano_schema.columns:
+            header = plano_schema.columns
+            rows = [self._pad(row) for row in rows]
+        else:
+            # Colunas fora da ordem do schema (ex.: planilha sem a coluna Versão):
+            # lê tudo uma vez; o primeiro save reescreve a planilha na ordem certa
+            values = worksheet.get_all_values()
+            header = values[GSHEETS_HEADER_ROW - 1]
+            # Linhas mais longas que o cabeçalho (ex.: append feito depois da
+            # migração com a coluna Versão) são cortadas na largura dele
+            rows = [(row + [''] * (len(header) - len(row)))[:len(header)] for row in values[GSHEETS_HEADER_ROW:]]
+        df = _rows_to_plano(header, rows)
+
+        non_empty = df.notna().any(axis=1).to_numpy()
+        df = df[non_empty].reset_index(drop=True)
+        # O snapshot só corresponde às posições da planilha se não havia linhas
+        # vazias no meio dos dados e as colunas estão na ordem do schema;
+        # caso contrário o primeiro save reescreve tudo.
+        contiguous = not non_empty.any() or non_empty[:np.flatnonzero(non_empty)[-1] + 1].all()
+        if header != plano_schema.columns:
+            contiguous = False
+        return df, plano_schema.format_for_gsheets(df) if contiguous else None
+
+    def load_changes(self, snapshot):
+        # Primeiro lê o cabeçalho e as colunas Nº Sequência e Versão; depois, em
+        # uma segunda chamada, só as linhas alteradas e o bloco de linhas novas.
+        # Retorna (posições, alteradas, novas) ou None (ver changed_rows).
+        seq_col = column_letter(plano_schema.columns.index("Nº Sequência"))
+        versao_col = column_letter(plano_schema.columns.index("Versão"))
+        worksheet = self._worksheet()
+        header, seqs, versoes = worksheet.batch_get([
+            self._schema_range(GSHEETS_HEADER_ROW, GSHEETS_HEADER_ROW),
+            f"{seq_col}{GSHEETS_FIRST_DATA_ROW}:{seq_col}",
+            f"{versao_col}{GSHEETS_FIRST_DATA_ROW}:{versao_col}",
+        ])
+        if (list(header[0]) if len(header) else []) != plano_schema.columns:
+            return None
+        n_linhas = max(len(seqs), len(versoes))
+        seqs = [row[0] if len(row) else '' for row in seqs] + [''] * (n_linhas - len(seqs))
+        versoes = [row[0] if len(row) else '' for row in versoes] + [''] * (n_linhas - len(versoes))
+        mudancas = changed_rows(snapshot, seqs, versoes)
+        if mudancas is None:
+            return None
+        posicoes, novas = mudancas
+        if not len(posicoes) and not len(novas):
+            return posicoes, plano_schema.empty(), plano_schema.empty()
+
+        ranges = [self._schema_range(GSHEETS_FIRST_DATA_ROW + row, GSHEETS_FIRST_DATA_ROW + row) for row in posicoes]
+        if len(novas):
+            ranges.append(self._schema_range(GSHEETS_FIRST_DATA_ROW + novas[0], GSHEETS_FIRST_DATA_ROW + novas[-1]))
+        resultados = worksheet.batch_get(ranges)
+        valores = [self._pad(resultado[0] if len(resultado) else []) for resultado in resultados[:len(posicoes)]]
+        valores_novos = [self._pad(row) for row in resultados[len(posicoes)]] if len(novas) else []
+        valores_novos += [self._pad([]) for _ in range(len(novas) - len(valores_novos))]
+
+        # Alguém gravou entre as duas leituras, ou há linhas vazias entre as novas:
+        # a releitura completa resolve
+        seq_idx = plano_schema.columns.index("Nº Sequência")
+        lidas = [row[seq_idx] for row in valores + valores_novos]
+        if lidas != [seqs[row] for row in np.concatenate([posicoes, novas])]:
+            return None
+        novas = _rows_to_plano(plano_schema.columns, valores_novos)
+        if not novas.notna().any(axis=1).all():
+            return None
+        return posicoes, _rows_to_plano(plano_schema.columns, valores), novas
+
+    def save(self, df, snapshot):
+        df_for_gsheets = plano_schema.format_for_gsheets(df)
+        alterado = changed_cells(df_for_gsheets, snapshot)
+        valores = df_for_gsheets.to_numpy()
+
+        if alterado is None:
+            # Schema ou ordem das linhas mudou: reescreve a planilha inteira
+            worksheet = self._worksheet()
+            worksheet.update(
+                [list(df_for_gsheets.columns)] + valores.tolist(),
+                range_name=f"A{GSHEETS_HEADER_ROW}",
+                value_input_option='USER_ENTERED'
+            )
+            # O update não apaga o que estava abaixo do bloco gravado (a planilha
+            # podia ter mais linhas, ou linhas vazias no meio): limpa até o final
+            first_empty = GSHEETS_FIRST_DATA_ROW + len(valores)
+            last_col = column_letter(max(worksheet.col_count, valores.shape[1]) - 1)
+            worksheet.batch_clear([f"A{first_empty}:{last_col}"])
+            self.writes += 2
+            return df_for_gsheets
+
+        updates = _cell_updates(valores, alterado, np.arange(len(alterado)))
+
+        # Linhas novas no final: um único range contíguo
+        n_anterior = len(snapshot)
+        if len(valores) > n_anterior:
+            first_row = GSHEETS_FIRST_DATA_ROW + n_anterior
+            last_row = GSHEETS_FIRST_DATA_ROW + len(valores) - 1
+            updates.append({
+                'range': f"A{first_row}:{column_letter(valores.shape[1] - 1)}{last_row}",
+                'values': valores[n_anterior:].tolist(),
+            })
+
+        if updates:
+            # Envia apenas as células alteradas em uma única chamada
+            self._worksheet().batch_update(updates, value_input_option='USER_ENTERED')
+            self.writes += 1
+        return df_for_gsheets
+
+    def save_rows(self, df, rows, snapshot):
+        delta = changed_cells_in_rows(df, rows, snapshot)
+        if delta is None:
+            return self.save(df, snapshot)
+        valores, alterado = delta
+        updates = _cell_updates(valores, alterado, rows)
+        if updates:
+            self._worksheet().batch_update(updates, value_input_option='USER_ENTERED')
+            self.writes += 1
+        snapshot.iloc[rows] = valores
+        return snapshot
+
+    def append(self, df_novos, snapshot):
+        df_for_gsheets = plano_schema.format_for_gsheets(df_novos)
+        self._worksheet().append_rows(
+            df_for_gsheets.to_numpy().tolist(),
+            value_input_option='USER_ENTERED',
+            table_range=f"A{GSHEETS_HEADER_ROW}"
+        )
+        self.writes += 1
+        if snapshot is None:
+            return None
+        return pd.concat([snapshot, df_for_gsheets], ignore_index=True)
+
+    def read_rows(self, rows, seqs):
+        # Relê as linhas (posições) em uma única chamada. Retorna None se alguma
+        # posição não tem mais o Nº Sequência esperado (a planilha mudou de forma).
+        if not len(rows):
+            return plano_schema.empty()
+        ranges = [self._schema_range(GSHEETS_FIRST_DATA_ROW + int(row), GSHEETS_FIRST_DATA_ROW + int(row)) for row in rows]
+        valores = [self._pad(resultado[0] if len(resultado) else []) for resultado in self._worksheet().batch_get(ranges)]
+        df = _rows_to_plano(plano_schema.columns, valores)
+        if [str(seq) for seq in df["Nº Sequência"]] != [str(seq) for seq in seqs]:
+            return None
+        return df
+
+    def version(self):
+        # Uma falha aqui não descarta o Worksheet aberto: a chamada é da API do
+        # Drive, que pode estar indisponível mesmo com o Sheets funcionando
+        # (o CachedStorage cai para um TTL). Quem reabre a planilha é o load.
+        return str(self._worksheet().spreadsheet.get_lastUpdateTime())
+
+# --- SQLite local ---
+
+class SQLiteStorage:
+    # Backend local para rodar e medir o app sem credenciais. Os valores são
+    # gravados no mesmo formato da planilha, com chave primária em 'Nº Sequência'
+    # e índice em 'Responsável'.
+    def __init__(self, path=":memory:"):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self.writes = 0
+        self._lock = threading.Lock()
+        columns = ", ".join(
+            f'"{col}" INTEGER PRIMARY KEY' if col == "Nº Sequência" else f'"{col}" TEXT'
+            for col in expected_dtypes
+        )
+        with self._lock, self._conn:
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS planos ({columns})")
+            # Bancos criados antes de uma coluna nova do schema (ex.: Versão)
+            existentes = {row[1] for row in self._conn.execute("PRAGMA table_info(planos)")}
+            for col in expected_dtypes:
+                if col not in existentes:
+                    self._conn.execute(f'ALTER TABLE planos ADD COLUMN "{col}" TEXT')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_planos_responsavel ON planos ("Responsável")')
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (revision INTEGER NOT NULL)")
+            if self._conn.execute("SELECT COUNT(*) FROM meta").fetchone()[0] == 0:
+                self._conn.execute("INSERT INTO meta (revision) VALUES (0)")
+
+    def _quoted_columns(self):
+        return ", ".join(f'"{col}"' for col in expected_dtypes)
+
+    def _upsert(self, rows, verb="INSERT OR REPLACE"):
+        placeholders = ", ".join("?" for _ in expected_dtypes)
+        self._conn.executemany(
+            f"{verb} INTO planos ({self._quoted_columns()}) VALUES ({placeholders})",
+            [[None if value == '' else value for value in row] for row in rows]
+        )
+        self._conn.execute("UPDATE meta SET revision = revision + 1")
+        self.writes += 1
+
+    def load(self):
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT {self._quoted_columns()} FROM planos ORDER BY "Nº Sequência"'
+            ).fetchall()
+        df = _rows_to_plano(list(expected_dtypes.keys()), [list(row) for row in rows])
+        return df, plano_schema.format_for_gsheets(df)
+
+    def save(self, df, snapshot):
+        df_for_db = plano_schema.format_for_gsheets(df)
+        alterado = changed_cells(df_for_db, snapshot)
+        valores = df_for_db.to_numpy()
+
+        with self._lock, self._conn:
+            if alterado is None:
+                self._conn.execute("DELETE FROM planos")
+                self._upsert(valores.tolist())
+            else:
+                changed_rows = np.flatnonzero(alterado.any(axis=1))
+                rows = valores[changed_rows].tolist() + valores[len(snapshot):].tolist()
+                if rows:
+                    self._upsert(rows)
+        return df_for_db
+
+    def save_rows(self, df, rows, snapshot):
+        delta = changed_cells_in_rows(df, rows, snapshot)
+        if delta is None:
+            return self.save(df, snapshot)
+        valores, alterado = delta
+        changed = alterado.any(axis=1)
+        if changed.any():
+            with self._lock, self._conn:
+                self._upsert(valores[changed].tolist())
+        snapshot.iloc[rows] = valores
+        return snapshot
+
+    def append(self, df_novos, snapshot):
+        df_for_db = plano_schema.format_for_gsheets(df_novos)
+        try:
+            with self._lock, self._conn:
+                # Sem REPLACE: um Nº Sequência repetido não sobrescreve a tarefa de outra pessoa
+                self._upsert(df_for_db.to_numpy().tolist(), verb="INSERT")
+        except sqlite3.IntegrityError as e:
+            raise StorageError(f"Nº Sequência já existe no banco: {e}") from e
+        if snapshot is None:
+            return None
+        return pd.concat([snapshot, df_for_db], ignore_index=True)
+
+    def read_rows(self, rows, seqs):
+        seqs = [int(seq) for seq in seqs]
+        with self._lock:
+            encontradas = {
+                row[0]: list(row)
+                for row in self._conn.execute(
+                    f'SELECT {self._quoted_columns()} FROM planos WHERE "Nº Sequência" IN ({", ".join("?" for _ in seqs)})',
+                    seqs
+                )
+            }
+        if len(encontradas) != len(set(seqs)):
+            return None
+        return _rows_to_plano(list(expected_dtypes.keys()), [encontradas[seq] for seq in seqs])
+
+    def load_changes(self, snapshot):
+        with self._lock:
+            chaves = self._conn.execute('SELECT "Nº Sequência", "Versão" FROM planos ORDER BY "Nº Sequência"').fetchall()
+        mudancas = changed_rows(snapshot, [seq for seq, _ in chaves], ['' if versao is None else versao for _, versao in chaves])
+        if mudancas is None:
+            return None
+        posicoes, novas = mudancas
+        rows = np.concatenate([posicoes, novas])
+        if not len(rows):
+            return posicoes, plano_schema.empty(), plano_schema.empty()
+        lidas = self.read_rows(rows, [chaves[row][0] for row in rows])
+        if lidas is None:
+            return None
+        return (posicoes, lidas.iloc[:len(posicoes)].reset_index(drop=True),
+                lidas.iloc[len(posicoes):].reset_index(drop=True))
+
+    def version(self):
+        with self._lock:
+            return str(self._conn.execute("SELECT revision FROM meta").fetchone()[0])
+
+# --- Worksheet em memória ---
+
+class FakeSpreadsheet:
+    def __init__(self, worksheet):
+        self._worksheet = worksheet
+
+    def get_lastUpdateTime(self):
+        self._worksheet._record("get_lastUpdateTime")
+        return str(self._worksheet.revision)
+
+class FakeAPIError(Exception):
+    # Mesmo formato do gspread.exceptions.APIError: código HTTP em .code
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+class FakeWorksheet:
+    # Substituto em memória do gspread.Worksheet com os métodos usados pelo app.
+    # Conta as chamadas à API e os bytes enviados, e pode simular latência e
+    # erros de cota (as próximas `rate_limit_errors` gravações falham com 429).
+    def __init__(self, values=None, latency=0.0, title="Planos"):
+        self.title = title
+        self.latency = latency
+        self.values = [[str(value) for value in row] for row in (values or [])]
+        self.revision = 0
+        self.calls = Counter()
+        self.bytes_sent = 0
+        self.rate_limit_errors = 0
+        self.spreadsheet = FakeSpreadsheet(self)
+
+    def _record(self, method, payload=None):
+        if payload is not None and self.rate_limit_errors:
+            self.rate_limit_errors -= 1
+            self.calls["rate_limited"] += 1
+            raise FakeAPIError(429, "Quota exceeded for quota metric 'Write requests'")
+        self.calls[method] += 1
+        if payload is not None:
+            self.bytes_sent += len(repr(payload).encode('utf-8'))
+        if self.latency:
+            time.sleep(self.latency)
+
+    @property
+    def row_count(self):
+        return len(self.values)
+
+    @property
+    def col_count(self):
+        return max((len(row) for row in self.values), default=0)
+
+    def _set_cell(self, row, col, value):
+        # row e col começam em 1, como na planilha
+        while len(self.values) < row:
+            self.values.append([])
+        line = self.values[row - 1]
+        while len(line) < col:
+            line.append('')
+        line[col - 1] = '' if value is None else str(value)
+
+    def _write(self, range_name, values):
+        first_row, first_col = cell_position(range_name.split(':')[0])
+        for i, row in enumerate(values):
+            for j, value in enumerate(row):
+                self._set_cell(first_row + i, first_col + j, value)
+
+    def get_all_values(self, **kwargs):
+        # Como o gspread: sem as linhas e colunas vazias do final e com todas as
+        # linhas completadas até a largura da mais longa
+        self._record("get_all_values")
+        rows = self._read(f"A1:{column_letter(max(self.col_count, 1) - 1)}")
+        largura = max((len(row) for row in rows), default=0)
+        return [row + [''] * (largura - len(row)) for row in rows]
+
+    def _read(self, range_name):
+        # Aceita ranges abertos como a API ("A2:M" vai até a última linha, "1:1"
+        # é a linha inteira)
+        start, _, end = range_name.partition(':')
+        first_row, first_col = cell_position(start)
+        last_row, last_col = cell_position(end or start)
+        first_row, first_col = first_row or 1, first_col or 1
+        last_row, last_col = last_row or len(self.values), last_col or self.col_count
+        rows = [list(self.values[row - 1][first_col - 1:last_col]) if row <= len(self.values) else []
+                for row in range(first_row, last_row + 1)]
+        # Como a API, omite as células vazias do final de cada linha e as linhas
+        # vazias do final
+        for row in rows:
+            while row and row[-1] == '':
+                row.pop()
+        while rows and not rows[-1]:
+            rows.pop()
+        return rows
+
+    def batch_get(self, ranges, **kwargs):
+        self._record("batch_get")
+        return [self._read(range_name) for range_name in ranges]
+
+    def update(self, values, range_name=None, **kwargs):
+        self._record("update", values)
+        self._write(range_name or "A1", values)
+        self.revision += 1
+
+    def batch_update(self, data, **kwargs):
+        self._record("batch_update", data)
+        for item in data:
+            self._write(item['range'], item['values'])
+        self.revision += 1
+
+    def batch_clear(self, ranges):
+        self._record("batch_clear", ranges)
+        for range_name in ranges:
+            start, _, end = range_name.partition(':')
+            first_row, first_col = cell_position(start)
+            last_row, last_col = cell_position(end or start)
+            first_row, first_col = first_row or 1, first_col or 1
+            last_row, last_col = last_row or len(self.values), last_col or self.col_count
+            for row in range(first_row, min(last_row, len(self.values)) + 1):
+                line = self.values[row - 1]
+                for col in range(first_col, min(last_col, len(line)) + 1):
+                    line[col - 1] = ''
+        self.revision += 1
+
+    def append_rows(self, values, **kwargs):
+        self._record("append_rows", values)
+        last_row = len(self.values)
+        while last_row and not any(self.values[last_row - 1]):
+            last_row -= 1
+        self._write(f"A{last_row + 1}", values)
+        self.revision += 1
@@ -2,34 +2,44 @@ import streamlit as st
 import pandas as pd
 from datetime import date
 import json
-import numpy as np
+import os
+import uuid
 
 # Importações para gspread
 import gspread
-from gspread_dataframe import set_with_dataframe, get_as_dataframe
+
+from schema import expected_dtypes, plano_schema, ACAO_ETAPA_OPTIONS, TIPO_ACAO_OPTIONS, STATUS_OPTIONS
+from agregados import PRAZO_OPTIONS, situacao_prazo
+from instrumentacao import InstrumentedProxy, SessaoMetricas, api_call, api_stats, configurar_log
+from filtros import PlanoFiltro, pagina, total_paginas
+from snapshot import PlanoSnapshot, SessionOverlay
+from save_queue import SaveQueue, PENDENTE, SALVO, FALHOU
+from storage import CachedStorage, GoogleSheetsStorage, SQLiteStorage, FakeWorksheet, StorageError
 
 st.set_page_config(layout="wide")
 st.title("🎍 PCMA - PLANO DE AÇÃO 2025")
 
+# --- Instrumentação ---
+# Tempos por etapa de cada rerun, chamadas à API e cache. PLANO_PERF_LOG grava um
+# JSON por rerun (caminho de arquivo ou "-" para stderr); o painel de debug na
+# barra lateral aparece com ?debug=1 na URL ou PLANO_DEBUG=1.
+configurar_log(os.environ.get("PLANO_PERF_LOG"))
+DEBUG_PANEL = os.environ.get("PLANO_DEBUG") == "1" or st.query_params.get("debug") == "1"
+
+if 'metricas' not in st.session_state:
+    st.session_state.metricas = SessaoMetricas(uuid.uuid4().hex[:8])
+metricas = st.session_state.metricas
+metricas.iniciar()
+
 # --- Variáveis de Configuração do Google Sheets ---
 GOOGLE_SHEET_ID = "1Ju6-V7bAXa-dnvWlZRcTyRMq4L48NQf07MCdoJLeRwQ"
 WORKSHEET_NAME = "Planos"
 
-# Definir a estrutura e os dtypes esperados para o DataFrame
-expected_dtypes = {
-    "Nº Sequência": 'Int64',
-    "Data Fato": 'datetime64[ns]',
-    "Responsável": 'str',
-    "Descreva sua tarefa": 'str',
-    "Ação/Etapa": 'str',
-    "Tipo Ação": 'str',
-    "Início Previsto": 'datetime64[ns]',
-    "Término Previsto": 'datetime64[ns]',
-    "Início Real": 'datetime64[ns]',
-    "Término Real": 'datetime64[ns]',
-    "Status": 'str',
-    "Observação": 'str'
-}
+# Backend de armazenamento: "gsheets" (padrão), "sqlite" ou "fake".
+# Os backends locais permitem rodar e medir o app sem credenciais.
+STORAGE_BACKEND = os.environ.get("PLANO_STORAGE", "gsheets")
+SQLITE_PATH = os.environ.get("PLANO_SQLITE_PATH", "planos.db")
+FAKE_LATENCY = float(os.environ.get("PLANO_FAKE_LATENCY", "0"))
 
 # --- Funções de Leitura/Escrita do Google Sheets (AGORA USANDO gspread) ---
 
@@ -41,83 +51,343 @@ def get_gspread_client():
         creds_attrdict = st.secrets["gsheets_service_account"]
         creds_dict = {key: value for key, value in creds_attrdict.items()}
         json_creds = json.dumps(creds_dict)
-        gc = gspread.service_account_from_dict(json.loads(json_creds))
-        return gc
+        with api_call("service_account_from_dict"):
+            gc = gspread.service_account_from_dict(json.loads(json_creds))
+        return InstrumentedProxy(gc)
     except Exception as e:
         st.error(f"Erro de autenticação com o Google Sheets: {e}")
         st.info("Verifique se suas credenciais de conta de serviço estão configuradas corretamente nos segredos do Streamlit Cloud.")
         return None
 
-# A função de carregamento de dados agora *chama* get_gspread_client internamente,
-# em vez de recebê-lo como um argumento.
-@st.cache_data(ttl=600) # Recarrega a cada 10 minutos
-def load_data_from_gsheets():
-    # Obtém o cliente gspread dentro da função em cache
-    client = get_gspread_client() 
+# Chamada só na primeira operação: o GoogleSheetsStorage guarda o Worksheet aberto
+# (e o reabre se ele deixar de responder)
+def open_gsheets_worksheet():
+    client = get_gspread_client()
     if not client:
-        return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in expected_dtypes.items()})
+        return None
+    sh = client.open_by_id(GOOGLE_SHEET_ID)
+    return sh.worksheet(WORKSHEET_NAME)
+
+# Cache write-through compartilhado pelo processo: depois de um save o cache recebe o
+# que acabou de ser gravado, e uma releitura só acontece quando a versão da
+# planilha (consultada no máximo a cada REVISION_CHECK_INTERVAL segundos) mudou.
+# A releitura traz só as linhas novas ou com Versão diferente; a planilha inteira é
+# relida no máximo a cada FULL_RESYNC_INTERVAL segundos, para pegar edições feitas
+# direto no Google Sheets.
+REVISION_CHECK_INTERVAL = 30
+FULL_RESYNC_INTERVAL = 600
+
+@st.cache_resource
+def get_storage():
+    if STORAGE_BACKEND == "sqlite":
+        backend = SQLiteStorage(SQLITE_PATH)
+    elif STORAGE_BACKEND == "fake":
+        worksheet = InstrumentedProxy(FakeWorksheet([list(expected_dtypes.keys())], latency=FAKE_LATENCY))
+        backend = GoogleSheetsStorage(lambda: worksheet)
+    else:
+        backend = GoogleSheetsStorage(open_gsheets_worksheet)
+    return CachedStorage(backend, check_interval=REVISION_CHECK_INTERVAL, resync_interval=FULL_RESYNC_INTERVAL)
+
+# Fila de gravação em segundo plano, compartilhada pelo processo: as edições são
+# mescladas por planilha e por sessão (o estado e os conflitos de cada lote são
+# de quem editou) e gravadas em lote fora do thread do script.
+SAVE_QUEUE_KEY = f"{STORAGE_BACKEND}:{GOOGLE_SHEET_ID}/{WORKSHEET_NAME}:{metricas.sessao}"
+
+@st.cache_resource
+def get_save_queue():
+    return SaveQueue(debounce=1.0, max_delay=5.0)
+
+# A função de carregamento de dados agora *chama* get_storage internamente,
+# em vez de recebê-lo como um argumento. Retorna o snapshot compartilhado por
+# todas as sessões do processo (somente leitura).
+def load_data_from_gsheets():
     try:
-        sh = client.open_by_id(GOOGLE_SHEET_ID)
-        worksheet = sh.worksheet(WORKSHEET_NAME)
-        
-        df = get_as_dataframe(worksheet, header=1, usecols=list(expected_dtypes.keys()))
-        
-        for col, dtype in expected_dtypes.items():
-            if col in df.columns:
-                if 'datetime' in str(dtype):
-                    df[col] = pd.to_datetime(df[col], errors='coerce', dayfirst=True)
-                elif 'Int64' in str(dtype):
-                    df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int64')
-                else:
-                    df[col] = df[col].astype(dtype)
-            else:
-                df[col] = pd.Series(dtype=dtype)
-        
-        df.dropna(how='all', inplace=True)
-        return df
+        storage = get_storage()
+        hits, misses = storage.hits, storage.misses
+        plano = storage.snapshot()
+        metricas.registrar_cache(storage.hits - hits, storage.misses - misses)
+        return plano
     except Exception as e:
         st.error(f"Erro ao carregar dados do Google Sheets: {e}")
-        initial_data_empty = {col: pd.Series(dtype=dtype) for col, dtype in expected_dtypes.items()}
-        return pd.DataFrame(initial_data_empty)
+        return PlanoSnapshot(plano_schema.empty(), versao=None)
 
-def save_data_to_gsheets(df_to_save):
-    # Obtém o cliente gspread dentro da função de salvar
-    client = get_gspread_client()
-    if not client:
-        st.error("Não foi possível salvar os dados: cliente Google Sheets não autenticado.")
-        return
+def save_data_to_gsheets(edits, bases):
+    # edits: {Nº Sequência: {coluna: valor}}; bases: Versão e valores que o usuário
+    # via antes de editar (controle otimista, ver CachedStorage.save_cells).
+    # Retorna na hora: a gravação acontece na fila em segundo plano (ver indicador_gravacao)
+    get_save_queue().submit(SAVE_QUEUE_KEY, edits, get_storage().save_cells, bases)
 
+def append_data_to_gsheets(df_novos):
+    # Caminho rápido para inserções: envia apenas as linhas novas com um único append.
+    # A numeração das linhas novas é feita pelo storage, sob o lock do processo.
     try:
-        sh = client.open_by_id(GOOGLE_SHEET_ID)
-        worksheet = sh.worksheet(WORKSHEET_NAME)
-
-        df_for_gsheets = df_to_save.copy()
-        
-        for col in df_for_gsheets.select_dtypes(include=['datetime64[ns]']).columns:
-            df_for_gsheets[col] = df_for_gsheets[col].dt.strftime('%d/%m/%Y').replace({pd.NA: ''})
-        
-        for col in df_for_gsheets.select_dtypes(include=['Int64']).columns:
-            df_for_gsheets[col] = df_for_gsheets[col].apply(lambda x: int(x) if pd.notna(x) else '')
-            
-        df_for_gsheets = df_for_gsheets.fillna('')
-
-        set_with_dataframe(worksheet, df_for_gsheets, include_index=False, include_column_header=True)
-        
-        st.success("Dados salvos com sucesso no Google Sheets!")
-        st.balloons()
+        get_storage().append(df_novos)
+        return True
+    except StorageError as e:
+        st.error(f"Não foi possível salvar os dados: {e}")
     except Exception as e:
         st.error(f"Erro ao salvar dados no Google Sheets: {e}")
+    return False
+
+# Indicador não bloqueante do estado da fila de gravação
+@st.fragment(run_every=2)
+def indicador_gravacao():
+    # Conflitos novos: recarrega a página para mostrar os valores atuais e o aviso
+    if len(get_save_queue().conflitos(SAVE_QUEUE_KEY)) != st.session_state.get("conflitos_exibidos", 0):
+        st.rerun(scope="app")
+    estado, detalhe = get_save_queue().status(SAVE_QUEUE_KEY)
+    if estado == PENDENTE:
+        st.caption(f"💾 Salvando alterações... {detalhe or ''}")
+    elif estado == SALVO:
+        st.caption("✅ Alterações salvas no Google Sheets")
+    elif estado == FALHOU:
+        st.warning(f"Erro ao salvar dados no Google Sheets: {detalhe}")
+        st.button("Tentar novamente", key="retry_save_button", on_click=get_save_queue().retry_failed, args=(SAVE_QUEUE_KEY,))
+
+def dispensar_conflitos():
+    get_save_queue().limpar_conflitos(SAVE_QUEUE_KEY)
+    st.session_state.conflitos_exibidos = 0
+
+def aviso_conflitos(conflitos):
+    # Edições que não foram gravadas porque outra pessoa alterou as mesmas células
+    if not conflitos:
+        return
+    st.warning(
+        "Algumas edições não foram gravadas porque outra pessoa alterou as mesmas tarefas "
+        "enquanto você editava. A tabela já mostra os valores atuais; refaça a edição se ainda for necessária."
+    )
+    st.dataframe(pd.DataFrame([
+        {
+            "Nº Sequência": conflito["Nº Sequência"],
+            "Coluna": conflito["coluna"] or "(tarefa removida)",
+            "Seu valor": "" if pd.isna(conflito["seu valor"]) else str(conflito["seu valor"]),
+            "Valor atual": "" if pd.isna(conflito["valor atual"]) else str(conflito["valor atual"]),
+        }
+        for conflito in conflitos
+    ]), hide_index=True, use_container_width=True)
+    st.button("Entendi", key="dispensar_conflitos_button", on_click=dispensar_conflitos)
 
 # --- Lógica de Carregamento de Dados ---
-# Agora, a função load_data_from_gsheets não recebe argumentos e busca o cliente internamente
-if 'df_planos' not in st.session_state:
-    st.session_state.df_planos = load_data_from_gsheets()
+# O plano não fica mais na session_state: cada rerun pega o snapshot atual do
+# processo (sem cópia) e a sessão guarda apenas as suas edições pendentes.
+metricas.marcar("configuração")
+plano = load_data_from_gsheets()
+metricas.marcar("carregar plano")
+
+if 'plano_overlay' not in st.session_state:
+    st.session_state.plano_overlay = SessionOverlay()
+overlay = st.session_state.plano_overlay
+
+# Conflitos das gravações desta sessão, exibidos no topo da página. O indicador
+# da barra lateral só força um rerun completo quando esse número muda.
+conflitos = get_save_queue().conflitos(SAVE_QUEUE_KEY)
+st.session_state.conflitos_exibidos = len(conflitos)
+
+# Edições que a fila já gravou estão no snapshot: saem do overlay
+if get_save_queue().status(SAVE_QUEUE_KEY)[0] in (None, SALVO):
+    overlay.limpar()
+else:
+    overlay.descartar_salvas(plano)
+
+# Tarefas incluídas no formulário e ainda não gravadas (várias tarefas por envio)
+if 'tarefas_pendentes' not in st.session_state:
+    st.session_state.tarefas_pendentes = []
+
+# Versão dos dados vistos pela sessão: muda com o snapshot ou com o overlay.
+# Os frames de exibição e as chaves dos editores são calculados a partir dela.
+versao_dados = (plano.versao, overlay.revisao)
+if 'editor_frames' not in st.session_state:
+    st.session_state.editor_frames = {}
+
+# --- Edição incremental a partir do st.data_editor ---
+EDITOR_COLUMN_CONFIG = {
+    "Nº Sequência": st.column_config.NumberColumn("Nº Sequência", disabled=True),
+    "Data Fato": st.column_config.DateColumn("Data Fato", format="DD/MM/YYYY", disabled=True),
+    "Responsável": st.column_config.TextColumn("Responsável", disabled=True),
+    "Descreva sua tarefa": st.column_config.TextColumn("Descreva sua tarefa", disabled=True),
+    "Ação/Etapa": st.column_config.TextColumn("Ação/Etapa", disabled=True),
+    "Tipo Ação": st.column_config.TextColumn("Tipo Ação", disabled=True),
+    "Início Previsto": st.column_config.DateColumn("Início Previsto", format="DD/MM/YYYY", help="Data prevista de início da tarefa"),
+    "Término Previsto": st.column_config.DateColumn("Término Previsto", format="DD/MM/YYYY", help="Data prevista de término da tarefa"),
+    "Início Real": st.column_config.DateColumn(
+        "Início Real",
+        format="DD/MM/YYYY",
+        help="Data real de início da tarefa"
+    ),
+    "Término Real": st.column_config.DateColumn(
+        "Término Real",
+        format="DD/MM/YYYY",
+        help="Data real de término da tarefa"
+    ),
+    "Status": st.column_config.SelectboxColumn(
+        "Status",
+        options=STATUS_OPTIONS,
+        required=True,
+        help="Status atual da tarefa"
+    ),
+    "Versão": None,
+    "Prazo": st.column_config.TextColumn(
+        "Prazo",
+        disabled=True,
+        help="Situação calculada a partir de Término Previsto, Término Real e da data de hoje"
+    ),
+    "Observação": st.column_config.TextColumn(
+        "Observação",
+        help="Qualquer observação relevante sobre a tarefa",
+        width="large"
+    ),
+}
+
+def _cache_por_versao(nome, chave, assinatura, calcular):
+    # Cache da sessão invalidado quando a versão dos dados (ou a assinatura) muda
+    versao = versao_dados
+    cache = st.session_state.setdefault(nome, {})
+    atual = cache.get(chave)
+    if atual is None or atual[0] != (versao, assinatura):
+        atual = cache[chave] = ((versao, assinatura), calcular())
+    return atual[1]
+
+def posicoes_filtradas(chave, filtro, base=None):
+    # Posições do snapshot que passam no filtro, em ordem de Nº Sequência.
+    # base: posições de partida (ex.: tarefas de um responsável); None = todas.
+    def calcular():
+        with metricas.span("filtros"):
+            texto = plano.texto if filtro.texto else None
+            posicoes = filtro.posicoes(plano.df, base, texto)
+            return overlay.filtrar(plano, filtro, posicoes, base)
+    return _cache_por_versao("posicoes_filtradas", chave, filtro.chave(), calcular)
+
+def frame_para_editor(chave, posicoes, assinatura=()):
+    # Frame exibido no editor, recalculado apenas quando a versão dos dados ou a
+    # página exibida (assinatura) mudam. Só as linhas da página são copiadas,
+    # já com as edições pendentes da sessão e a situação de prazo de cada uma.
+    # As datas continuam datetime (o DateColumn exibe no formato DD/MM/YYYY).
+    def calcular():
+        with metricas.span("preparo do editor"):
+            frame = overlay.frame(plano, posicoes)
+            frame.insert(frame.columns.get_loc("Status") + 1, "Prazo", situacao_prazo(frame, date.today()))
+            return frame
+    return _cache_por_versao("editor_frames", chave, (assinatura, date.today()), calcular)
+
+def agregados_do_plano():
+    def calcular():
+        with metricas.span("agregados"):
+            return overlay.agregados(plano, date.today())
+    return _cache_por_versao("agregados", "plano", date.today(), calcular)
+
+def aplicar_edicoes_editor(editor_key, df_exibido):
+    # Callback do editor: guarda no overlay da sessão apenas as células alteradas
+    # (edited_rows), identificadas pelo Nº Sequência, e as envia para a fila
+    edited_rows = st.session_state[editor_key]["edited_rows"]
+    if not edited_rows:
+        return
+    seqs = df_exibido["Nº Sequência"].to_numpy()
+    # As edições são gravadas pelo Nº Sequência: uma linha sem número, ou com um
+    # número repetido na planilha, não pode ser identificada, então essas edições
+    # não são aplicadas
+    repetidos = get_storage().snapshot().indice.repetidos()
+
+    with st.session_state.metricas.span("aplicar edições"):
+        edits = {}
+        bases = {}
+        ignoradas = set()
+        sem_numero = 0
+        for pos, mudancas in edited_rows.items():
+            linha = int(pos)
+            if pd.isna(seqs[linha]):
+                sem_numero += 1
+                continue
+            if int(seqs[linha]) in repetidos:
+                ignoradas.add(int(seqs[linha]))
+                continue
+            for col, valor in mudancas.items():
+                valor = plano_schema.from_editor(col, valor)
+                anterior = df_exibido[col].iat[linha]
+                if not plano_schema.same_value(anterior, valor):
+                    seq = int(seqs[linha])
+                    edits.setdefault(seq, {})[col] = valor
+                    base = bases.setdefault(seq, {"Versão": df_exibido["Versão"].iat[linha]})
+                    base[col] = anterior
+
+        if edits:
+            st.session_state.plano_overlay.aplicar(edits)
+            save_data_to_gsheets(edits, bases)
+    if sem_numero:
+        st.warning(
+            f"Edições não aplicadas em {sem_numero} tarefa(s) sem Nº Sequência. "
+            "Preencha o número no Google Sheets para editar essas tarefas."
+        )
+    if ignoradas:
+        st.warning(
+            "Edições não aplicadas: o Nº Sequência "
+            f"{', '.join(str(seq) for seq in sorted(ignoradas))} aparece em mais de uma linha da planilha. "
+            "Corrija a numeração no Google Sheets para editar essas tarefas."
+        )
+    if edits:
+        st.success("Tabela atualizada!")
+
+def data_editor_plano(chave, df_exibido, assinatura=()):
+    # A chave muda com a versão dos dados e com a página exibida: depois de aplicar
+    # uma edição (ou trocar de página/filtro) o editor recomeça com edited_rows vazio
+    editor_key = f"editor_{chave}_{hash((versao_dados, assinatura)) & 0xffffffff:x}"
+    with metricas.span("st.data_editor"):
+        st.data_editor(
+            df_exibido,
+            key=editor_key,
+            on_change=aplicar_edicoes_editor,
+            args=(editor_key, df_exibido),
+            num_rows="fixed",
+            column_config=EDITOR_COLUMN_CONFIG,
+            hide_index=True,
+            use_container_width=True
+        )
+
+# --- Filtros e paginação do editor ---
+PAGE_SIZE_OPTIONS = [25, 50, 100, 200]
+
+def controles_filtro(chave):
+    df = plano.df
+    with st.expander("🔎 Filtros e busca"):
+        col_status, col_tipo = st.columns(2)
+        with col_status:
+            status = st.multiselect("Status", list(df["Status"].cat.categories), key=f"filtro_status_{chave}")
+        with col_tipo:
+            tipos = st.multiselect("Tipo Ação", list(df["Tipo Ação"].cat.categories), key=f"filtro_tipo_{chave}")
+        col_data, col_periodo = st.columns(2)
+        with col_data:
+            coluna_data = st.selectbox("Filtrar período por", plano_schema.date_columns, key=f"filtro_coluna_data_{chave}")
+        with col_periodo:
+            periodo = st.date_input("Período", value=[], format="DD/MM/YYYY", key=f"filtro_periodo_{chave}")
+        texto = st.text_input("Buscar em tarefa e observação", placeholder="Ex.: bomba manutenção", key=f"filtro_texto_{chave}")
+    inicio = periodo[0] if len(periodo) > 0 else None
+    fim = periodo[1] if len(periodo) > 1 else None
+    return PlanoFiltro(status, tipos, coluna_data, inicio, fim, texto)
+
+def editor_paginado(chave, base=None):
+    # Editor com filtros e paginação no servidor: apenas a página atual vai para o
+    # navegador, e as edições voltam ao plano pelo Nº Sequência
+    filtro = controles_filtro(chave)
+    posicoes = posicoes_filtradas(chave, filtro, base)
+    if len(posicoes) == 0:
+        st.info("Nenhuma tarefa encontrada com os filtros selecionados.")
+        return
 
-# --- Função para Salvar o DataFrame ---
-def save_data():
-    load_data_from_gsheets.clear() # Limpa o cache para forçar a releitura
-    # save_data_to_gsheets agora também não recebe o cliente como argumento
-    save_data_to_gsheets(st.session_state.df_planos)
+    col_tamanho, col_pagina, col_total = st.columns([1, 1, 2])
+    with col_tamanho:
+        tamanho = st.selectbox("Linhas por página", PAGE_SIZE_OPTIONS, index=1, key=f"page_size_{chave}")
+    n_paginas = total_paginas(len(posicoes), tamanho)
+    page_key = f"page_{chave}"
+    # Um filtro mais restrito pode deixar a página atual fora do intervalo
+    if st.session_state.get(page_key, 1) > n_paginas:
+        st.session_state[page_key] = n_paginas
+    with col_pagina:
+        numero = st.number_input("Página", min_value=1, max_value=n_paginas, step=1, key=page_key)
+    with col_total:
+        st.caption(f"{len(posicoes)} tarefa(s) — página {numero} de {n_paginas}")
+
+    assinatura = (filtro.chave(), numero, tamanho)
+    df_exibido = frame_para_editor(chave, pagina(posicoes, numero, tamanho), assinatura)
+    data_editor_plano(chave, df_exibido, assinatura)
 
 # --- Função para limpar os inputs do formulário ---
 def clear_form():
@@ -129,6 +399,28 @@ def clear_form():
     st.session_state.status_key = "Sem Data"
     st.session_state.observacao_key = ""
 
+# --- Registro de tarefa a partir dos campos do formulário ---
+def _registro_do_formulario():
+    return {
+        "Data Fato": st.session_state.data_fato_key,
+        "Responsável": st.session_state.responsavel_key,
+        "Descreva sua tarefa": st.session_state.tarefa_key,
+        "Ação/Etapa": st.session_state.acaoetapa_key,
+        "Tipo Ação": st.session_state.tipoacao_key,
+        "Início Previsto": pd.NaT,
+        "Término Previsto": pd.NaT,
+        "Início Real": pd.NaT,
+        "Término Real": pd.NaT,
+        "Status": st.session_state.status_key,
+        "Observação": st.session_state.observacao_key,
+        "Versão": 1
+    }
+
+# Callback do botão "Incluir e adicionar outra": guarda a tarefa e limpa o formulário
+def incluir_tarefa_pendente():
+    st.session_state.tarefas_pendentes.append(_registro_do_formulario())
+    clear_form()
+
 # --- Controle de navegação na barra lateral ---
 if 'current_view' not in st.session_state:
     st.session_state.current_view = "Plano de Ação" # Página inicial padrão
@@ -156,6 +448,8 @@ if 'observacao_key' not in st.session_state:
 
 # --- Barra Lateral ---
 st.sidebar.title("Navegação")
+with st.sidebar:
+    indicador_gravacao()
 
 # Botão para ver todos os planos
 if st.sidebar.button("Plano de Ação", key="view_all_plans_button"):
@@ -174,10 +468,9 @@ st.sidebar.markdown("---")
 st.sidebar.subheader("Planos por Responsável")
 
 # Obtém a lista única de responsáveis do DataFrame
-# Atualizado para buscar do df_planos da session_state
-if not st.session_state.df_planos.empty:
-    responsaveis = st.session_state.df_planos["Responsável"].dropna().unique().tolist()
-    responsaveis.sort() # Opcional: ordenar por nome
+if not plano.empty:
+    # Nomes vindos do índice de responsáveis (já ordenados), sem varrer o plano
+    responsaveis = plano.indice.responsaveis()
     
     for responsavel in responsaveis:
         if st.sidebar.button(responsavel, key=f"responsavel_{responsavel.replace(' ', '_')}"):
@@ -187,7 +480,11 @@ if not st.session_state.df_planos.empty:
 else:
     st.sidebar.info("Nenhum responsável encontrado ainda.")
 
+metricas.marcar("barra lateral")
+
 # --- Conteúdo Principal ---
+aviso_conflitos(conflitos)
+
 if st.session_state.current_view == "Adicionar Tarefa":
     st.subheader("Adicionar Nova Tarefa")
 
@@ -196,141 +493,84 @@ if st.session_state.current_view == "Adicionar Tarefa":
         data_fato = st.date_input("Data Fato", format="DD/MM/YYYY", value=st.session_state.data_fato_key, key="data_fato_key")
         responsavel = st.text_input("Responsável", placeholder="Nome do responsável", value=st.session_state.responsavel_key, key="responsavel_key")
         tarefa = st.text_area("Descreva sua tarefa", placeholder="Detalhes da tarefa", value=st.session_state.tarefa_key, key="tarefa_key")
-        acaoetapa = st.selectbox("Ação/Etapa", ["Ação", "Etapa"], index=["Ação", "Etapa"].index(st.session_state.acaoetapa_key), key="acaoetapa_key")
-        tipoacao = st.selectbox("Tipo Ação", ["Ação de Melhoria", "Ação Imediata", "Ação Corretiva"], index=["Ação de Melhoria", "Ação Imediata", "Ação Corretiva"].index(st.session_state.tipoacao_key), key="tipoacao_key")
-        status = st.selectbox("Status", ["Sem Data", "Atrasada", "Planejada", "Cancelada", "Em Andamento", "Concluída"], index=["Sem Data", "Atrasada", "Planejada", "Cancelada", "Em Andamento", "Concluída"].index(st.session_state.status_key), key="status_key")
+        acaoetapa = st.selectbox("Ação/Etapa", ACAO_ETAPA_OPTIONS, index=ACAO_ETAPA_OPTIONS.index(st.session_state.acaoetapa_key), key="acaoetapa_key")
+        tipoacao = st.selectbox("Tipo Ação", TIPO_ACAO_OPTIONS, index=TIPO_ACAO_OPTIONS.index(st.session_state.tipoacao_key), key="tipoacao_key")
+        status = st.selectbox("Status", STATUS_OPTIONS, index=STATUS_OPTIONS.index(st.session_state.status_key), key="status_key")
         observacao = st.text_area("Observação", placeholder="Adicione observações aqui (opcional)", value=st.session_state.observacao_key, key="observacao_key")
 
-        submitted = st.form_submit_button("Adicionar Tarefa")
+        col_adicionar, col_incluir = st.columns(2)
+        with col_adicionar:
+            submitted = st.form_submit_button("Adicionar Tarefa")
+        with col_incluir:
+            st.form_submit_button("Incluir e adicionar outra", on_click=incluir_tarefa_pendente)
+
+    if st.session_state.tarefas_pendentes:
+        st.caption(f"{len(st.session_state.tarefas_pendentes)} tarefa(s) aguardando gravação junto com a próxima tarefa adicionada")
+        st.dataframe(
+            pd.DataFrame(st.session_state.tarefas_pendentes)[["Data Fato", "Responsável", "Descreva sua tarefa", "Tipo Ação", "Status"]],
+            use_container_width=True,
+            hide_index=True
+        )
 
     if submitted:
-        next_sequence_num = 1
-        if not st.session_state.df_planos.empty:
-            # Garante que a coluna 'Nº Sequência' seja numérica antes de buscar o máximo
-            st.session_state.df_planos["Nº Sequência"] = pd.to_numeric(st.session_state.df_planos["Nº Sequência"], errors='coerce')
-            next_sequence_num = st.session_state.df_planos["Nº Sequência"].fillna(0).max() + 1
-            
-        novo_registro = {
-            "Nº Sequência": next_sequence_num,
-            "Data Fato": data_fato,
-            "Responsável": responsavel,
-            "Descreva sua tarefa": tarefa,
-            "Ação/Etapa": acaoetapa,
-            "Tipo Ação": tipoacao,
-            "Início Previsto": pd.NaT,
-            "Término Previsto": pd.NaT,
-            "Início Real": pd.NaT,
-            "Término Real": pd.NaT,
-            "Status": status,
-            "Observação": observacao
-        }
+        registros = st.session_state.tarefas_pendentes + [_registro_do_formulario()]
 
-        # Concatenação e ajuste de dtypes
-        novo_df_temp = pd.DataFrame([novo_registro])
-        novo_df_temp = novo_df_temp.astype({col: dtype for col, dtype in expected_dtypes.items() if col in novo_df_temp.columns})
-        
-        st.session_state.df_planos = pd.concat(
-            [st.session_state.df_planos, novo_df_temp],
-            ignore_index=True
-        ).astype(expected_dtypes) # Garante que todo o DF final tenha os dtypes corretos
+        # O Nº Sequência é atribuído pelo storage na gravação (ver CachedStorage.append).
+        # Ajuste de dtypes apenas nas linhas novas
+        novo_df_temp = plano_schema.coerce(pd.DataFrame(registros, columns=plano_schema.columns))
 
-        st.success("Novo plano de ação adicionado com sucesso!")
-        save_data() # Chama a função que agora salva no Google Sheets
-        
-        st.rerun()
+        if append_data_to_gsheets(novo_df_temp):
+            # O próximo rerun já pega o snapshot com as linhas novas
+            st.session_state.tarefas_pendentes = []
+            st.success(f"{len(registros)} nova(s) tarefa(s) adicionada(s) com sucesso!")
+            st.rerun()
 
 elif st.session_state.current_view == "Plano de Ação":
     st.subheader("- Visão Geral do Plano de Ação") # Título mais descritivo
 
-    if not st.session_state.df_planos.empty:
+    if not plano.empty:
         # --- 1. Tabela de Planos de Ação Editável ---
         st.caption("Detalhes do Plano de Ação")
-        df_exibicao = st.session_state.df_planos.sort_values(by="Nº Sequência", ascending=True)
+        editor_paginado("plano")
+        metricas.marcar("editor do plano")
 
-        # Pré-processa as colunas de data para o data_editor
-        df_for_editor = df_exibicao.copy()
-        for col in ["Início Previsto", "Término Previsto", "Início Real", "Término Real"]:
-            if col in df_for_editor.columns:
-                # Converte pd.NaT para string vazia para exibição no editor
-                df_for_editor[col] = df_for_editor[col].dt.strftime('%d/%m/%Y').replace({pd.NA: ''})
+        st.markdown("---") # Separador visual
 
-        edited_df = st.data_editor(
-            df_for_editor,
-            num_rows="fixed",
-            column_config={
-                "Nº Sequência": st.column_config.NumberColumn("Nº Sequência", disabled=True),
-                "Data Fato": st.column_config.TextColumn("Data Fato", disabled=True), # Mudado para TextColumn para exibir string
-                "Responsável": st.column_config.TextColumn("Responsável", disabled=True),
-                "Descreva sua tarefa": st.column_config.TextColumn("Descreva sua tarefa", disabled=True),
-                "Ação/Etapa": st.column_config.TextColumn("Ação/Etapa", disabled=True),
-                "Tipo Ação": st.column_config.TextColumn("Tipo Ação", disabled=True),
-                "Início Previsto": st.column_config.DateColumn("Início Previsto", format="DD/MM/YYYY", help="Data prevista de início da tarefa"),
-                "Término Previsto": st.column_config.DateColumn("Término Previsto", format="DD/MM/YYYY", help="Data prevista de término da tarefa"),
-                "Início Real": st.column_config.DateColumn(
-                    "Início Real",
-                    format="DD/MM/YYYY",
-                    help="Data real de início da tarefa"
-                ),
-                "Término Real": st.column_config.DateColumn(
-                    "Término Real",
-                    format="DD/MM/YYYY",
-                    help="Data real de término da tarefa"
-                ),
-                "Status": st.column_config.SelectboxColumn(
-                    "Status",
-                    options=["Sem Data", "Atrasada", "Planejada", "Cancelada", "Em Andamento", "Concluída"],
-                    required=True,
-                    help="Status atual da tarefa"
-                ),
-                "Observação": st.column_config.TextColumn(
-                    "Observação",
-                    help="Qualquer observação relevante sobre a tarefa",
-                    width="large"
-                ),
-            },
-            hide_index=True,
-            use_container_width=True
-        )
+        # Contagens mantidas incrementalmente (ver agregados.py), com as edições pendentes da sessão
+        agregados = agregados_do_plano()
+
+        # --- 2. Situação dos Prazos ---
+        st.caption("⏰ Situação dos Prazos")
+        prazos = agregados.contagem("Prazo")
+        for coluna, situacao in zip(st.columns(len(PRAZO_OPTIONS)), PRAZO_OPTIONS):
+            coluna.metric(situacao, int(prazos.get(situacao, 0)))
+
+        vencidas = agregados.vencidas_por_responsavel()
+        if not vencidas.empty:
+            st.caption("🚨 Tarefas Vencidas por Responsável (Término Previsto antes de hoje, sem Término Real)")
+            st.bar_chart(vencidas.rename("Tarefas Vencidas"))
 
-        # Pós-processamento para converter de volta para os tipos de dados originais
-        df_after_edit = edited_df.copy()
-        for col, dtype in expected_dtypes.items():
-            if col in df_after_edit.columns:
-                if 'datetime' in str(dtype):
-                    df_after_edit[col] = pd.to_datetime(df_after_edit[col], errors='coerce', dayfirst=True)
-                elif 'Int64' in str(dtype):
-                    df_after_edit[col] = pd.to_numeric(df_after_edit[col], errors='coerce').astype('Int64')
-                else:
-                    df_after_edit[col] = df_after_edit[col].astype(dtype)
-            
-        if not df_after_edit.equals(st.session_state.df_planos): # Compara com o DF original para evitar saves desnecessários
-            st.session_state.df_planos = df_after_edit
-            save_data()
-            st.success("Tabela atualizada!")
-            
         st.markdown("---") # Separador visual
 
-        # --- 2. Tabela de Quantidade por Status ---
-        st.caption("🌱 Quantidade de Tarefas por Status")
-        # Garante que 'Status' é string para value_counts
-        if "Status" in st.session_state.df_planos.columns:
-            df_tasks_by_status = st.session_state.df_planos["Status"].astype(str).value_counts().reset_index()
+        # --- 3. Tabela de Quantidade por Status e por Tipo Ação ---
+        col_status, col_tipo = st.columns(2)
+        with col_status:
+            st.caption("🌱 Quantidade de Tarefas por Status")
+            df_tasks_by_status = agregados.contagem("Status", ordem=plano.df["Status"].cat.categories).reset_index()
             df_tasks_by_status.columns = ["Status", "Quantidade de Tarefas"]
             st.dataframe(df_tasks_by_status, use_container_width=True, hide_index=True)
-        else:
-            st.info("Colunas de status não encontradas.")
+        with col_tipo:
+            st.caption("🛠️ Quantidade de Tarefas por Tipo Ação")
+            df_tasks_by_tipo = agregados.contagem("Tipo Ação").reset_index()
+            df_tasks_by_tipo.columns = ["Tipo Ação", "Quantidade de Tarefas"]
+            st.dataframe(df_tasks_by_tipo, use_container_width=True, hide_index=True)
 
         st.markdown("---") # Separador visual
 
-        # --- 3. Gráfico de Tarefas por Responsável ---
+        # --- 4. Gráfico de Tarefas por Responsável ---
         st.caption("🌳 Quantidade de Tarefas por Responsável")
-        # Garante que 'Responsável' é string para value_counts
-        if "Responsável" in st.session_state.df_planos.columns:
-            df_tasks_by_responsavel = st.session_state.df_planos["Responsável"].astype(str).value_counts().reset_index()
-            df_tasks_by_responsavel.columns = ["Responsável", "Quantidade de Tarefas"]
-            st.bar_chart(df_tasks_by_responsavel.set_index("Responsavel"))
-        else:
-            st.info("Colunas de responsável não encontradas.")
+        st.bar_chart(agregados.contagem("Responsável").rename("Quantidade de Tarefas"))
+        metricas.marcar("dashboards")
 
     else:
         st.info("Nenhum plano de ação adicionado ainda. Adicione tarefas para ver os dados.")
@@ -338,78 +578,46 @@ elif st.session_state.current_view == "Plano de Ação":
 elif st.session_state.current_view == "Filtrado por Responsável":
     if st.session_state.selected_responsavel:
         st.subheader(f"- Tarefas de: {st.session_state.selected_responsavel}")
-        df_filtrado = st.session_state.df_planos[st.session_state.df_planos["Responsável"] == st.session_state.selected_responsavel].copy()
-        
-        if not df_filtrado.empty:
-            df_exibicao_filtrada = df_filtrado.sort_values(by="Nº Sequência", ascending=True)
-
-            # Pré-processa as colunas de data para o data_editor
-            df_for_editor_filtered = df_exibicao_filtrada.copy()
-            for col in ["Início Previsto", "Término Previsto", "Início Real", "Término Real"]:
-                if col in df_for_editor_filtered.columns:
-                    df_for_editor_filtered[col] = df_for_editor_filtered[col].dt.strftime('%d/%m/%Y').replace({pd.NA: ''})
-
-            edited_df_filtered = st.data_editor(
-                df_for_editor_filtered,
-                num_rows="fixed",
-                column_config={
-                    "Nº Sequência": st.column_config.NumberColumn("Nº Sequência", disabled=True),
-                    "Data Fato": st.column_config.TextColumn("Data Fato", disabled=True), # Mudado para TextColumn para exibir string
-                    "Responsável": st.column_config.TextColumn("Responsável", disabled=True),
-                    "Descreva sua tarefa": st.column_config.TextColumn("Descreva sua tarefa", disabled=True),
-                    "Ação/Etapa": st.column_config.TextColumn("Ação/Etapa", disabled=True),
-                    "Tipo Ação": st.column_config.TextColumn("Tipo Ação", disabled=True),
-                    "Início Previsto": st.column_config.DateColumn("Início Previsto", format="DD/MM/YYYY", help="Data prevista de início da tarefa"),
-                    "Término Previsto": st.column_config.DateColumn("Término Previsto", format="DD/MM/YYYY", help="Data prevista de término da tarefa"),
-                    "Início Real": st.column_config.DateColumn(
-                        "Início Real",
-                        format="DD/MM/YYYY",
-                        help="Data real de início da tarefa"
-                    ),
-                    "Término Real": st.column_config.DateColumn(
-                        "Término Real",
-                        format="DD/MM/YYYY",
-                        help="Data real de término da tarefa"
-                    ),
-                    "Status": st.column_config.SelectboxColumn(
-                        "Status",
-                        options=["Sem Data", "Atrasada", "Planejada", "Cancelada", "Em Andamento", "Concluída"],
-                        required=True,
-                        help="Status atual da tarefa"
-                    ),
-                    "Observação": st.column_config.TextColumn(
-                        "Observação",
-                        help="Qualquer observação relevante sobre a tarefa",
-                        width="large"
-                    ),
-                },
-                hide_index=True,
-                use_container_width=True
-            )
-
-            # Pós-processamento para converter de volta para os tipos de dados originais
-            df_after_edit_filtered = edited_df_filtered.copy()
-            for col, dtype in expected_dtypes.items():
-                if col in df_after_edit_filtered.columns:
-                    if 'datetime' in str(dtype):
-                        df_after_edit_filtered[col] = pd.to_datetime(df_after_edit_filtered[col], errors='coerce', dayfirst=True)
-                    elif 'Int64' in str(dtype):
-                        df_after_edit_filtered[col] = pd.to_numeric(df_after_edit_filtered[col], errors='coerce').astype('Int64')
-                    else:
-                        df_after_edit_filtered[col] = df_after_edit_filtered[col].astype(dtype)
-
-            # Concatena o DataFrame filtrado editado de volta ao DataFrame completo
-            # Primeiro, remove as linhas correspondentes ao responsável do df_planos
-            df_restante = st.session_state.df_planos[st.session_state.df_planos["Responsável"] != st.session_state.selected_responsavel]
-            # Em seguida, concatena as linhas editadas (do responsável selecionado)
-            st.session_state.df_planos = pd.concat([df_restante, df_after_edit_filtered], ignore_index=True).astype(expected_dtypes)
-
-            if not edited_df_filtered.equals(df_exibicao_filtrada): # Compara com o DF original filtrado
-                save_data()
-                st.success("Tabela atualizada!")
+        responsavel = st.session_state.selected_responsavel
+        # Consulta ao índice: custo proporcional às tarefas do responsável
+        posicoes_responsavel = plano.indice.posicoes_responsavel(responsavel)
+
+        if len(posicoes_responsavel):
+            editor_paginado(f"responsavel_{responsavel}", base=posicoes_responsavel)
         else:
             st.info(f"Nenhum plano de ação encontrado para {st.session_state.selected_responsavel}.")
     else:
         st.info("Selecione um responsável na barra lateral para filtrar.")
 else:
     st.info("Selecione uma opção na barra lateral para começar.")
+
+metricas.marcar(f"tela: {st.session_state.current_view}")
+
+# --- Painel de debug (oculto) ---
+def painel_debug():
+    trace = metricas.atual
+    with st.sidebar.expander("🛠️ Debug de desempenho"):
+        st.caption(f"Rerun atual: {trace.decorrido_ms():.1f} ms até aqui · cache: {trace.cache['hits']} hit(s), {trace.cache['misses']} miss(es)")
+        st.dataframe(pd.DataFrame(trace.spans, columns=["nome", "ms"]), hide_index=True, use_container_width=True)
+        if trace.api:
+            st.caption("Chamadas à API neste rerun")
+            st.dataframe(pd.DataFrame(trace.api), hide_index=True, use_container_width=True)
+
+        storage = get_storage()
+        st.caption(f"Cache do processo: {storage.hits} hit(s), {storage.misses} miss(es)")
+        resumo_api = api_stats.resumo()
+        if resumo_api:
+            st.caption("Chamadas à API no processo (inclui a fila de gravação)")
+            st.dataframe(pd.DataFrame.from_dict(resumo_api, orient="index").round(1), use_container_width=True)
+
+        if metricas.historico:
+            st.caption("Reruns anteriores desta sessão")
+            st.dataframe(pd.DataFrame([
+                {"duração ms": t.duracao_ms, "interrompido": t.interrompido, "API": len(t.api), **{s["nome"]: s["ms"] for s in t.spans}}
+                for t in reversed(metricas.historico)
+            ]), hide_index=True, use_container_width=True)
+
+if DEBUG_PANEL:
+    painel_debug()
+
+metricas.finalizar()
@@ -0,0 +1,12 @@
+import pytest
+
+from exemplos import linha, planilha, sqlite_com
+from storage import GoogleSheetsStorage
+
+@pytest.fixture(params=["gsheets", "sqlite"])
+def backend(request):
+    # Mesmo plano (Nº Sequência 1 a 3) nos dois backends
+    if request.param == "gsheets":
+        worksheet = planilha(linha(1), linha(2), linha(3))
+        return GoogleSheetsStorage(lambda: worksheet)
+    return sqlite_com(1, 2, 3)
@@ -0,0 +1,29 @@
+# Planilhas e tarefas de exemplo usadas pelos testes
+import numpy as np
+import pandas as pd
+
+from schema import plano_schema
+from storage import FakeWorksheet, SQLiteStorage
+
+def linha(seq, responsavel="Ana", status="Planejada", versao="1", termino_real="", inicio_previsto=""):
+    # Uma linha da planilha, como texto, na ordem das colunas do schema
+    return [str(seq), "01/01/2025", responsavel, f"Tarefa {seq}", "Ação", "Ação Imediata",
+            inicio_previsto, "", "", termino_real, status, "", versao]
+
+def planilha(*linhas):
+    return FakeWorksheet([plano_schema.columns, *linhas])
+
+def plano(*linhas):
+    # DataFrame tipado com as linhas dadas (como o loader montaria)
+    return plano_schema.coerce(pd.DataFrame(list(linhas), columns=plano_schema.columns).replace({'': np.nan}))
+
+def novas_tarefas(n, responsavel="Bia"):
+    return plano_schema.coerce(pd.DataFrame(
+        [{"Responsável": responsavel, "Descreva sua tarefa": "Nova", "Status": "Planejada", "Versão": 1}] * n,
+        columns=plano_schema.columns,
+    ))
+
+def sqlite_com(*seqs):
+    backend = SQLiteStorage()
+    backend.save(plano(*(linha(seq) for seq in seqs)), None)
+    return backend
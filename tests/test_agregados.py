@@ -0,0 +1,67 @@
+from datetime import date
+
+import pandas as pd
+
+from agregados import PlanoAgregados, situacao_prazo
+from exemplos import linha, plano
+from schema import plano_schema
+
+HOJE = date(2025, 3, 10)
+
+def com_prazo(seq, termino_previsto, **kwargs):
+    valores = linha(seq, **kwargs)
+    valores[7] = termino_previsto
+    return valores
+
+def exemplo():
+    return plano(
+        com_prazo(1, "01/03/2025"),                              # vencida
+        com_prazo(2, "14/03/2025", responsavel="Bia"),           # vence em breve
+        com_prazo(3, "30/04/2025"),                              # no prazo
+        com_prazo(4, ""),                                        # sem prazo
+        com_prazo(5, "01/03/2025", termino_real="02/03/2025"),   # encerrada
+        com_prazo(6, "01/03/2025", responsavel="Bia", status="Cancelada"),
+        com_prazo(7, "05/03/2025", responsavel="Bia"),           # vencida
+    )
+
+def test_situacao_prazo():
+    situacao = situacao_prazo(exemplo(), HOJE)
+    assert list(situacao) == ["Vencida", "Vence em breve", "No prazo", "Sem prazo",
+                              "Encerrada", "Encerrada", "Vencida"]
+    assert list(situacao_prazo(exemplo(), HOJE, dias_alerta=2))[1] == "No prazo"
+
+def test_contagens():
+    agregados = PlanoAgregados.calcular(exemplo(), HOJE)
+    assert agregados.contagem("Responsável").to_dict() == {"Ana": 4, "Bia": 3}
+    assert agregados.contagem("Prazo", ["Vencida", "Encerrada", "No prazo"]).to_dict() == \
+        {"Vencida": 2, "Encerrada": 2, "No prazo": 1}
+    assert agregados.vencidas_por_responsavel().to_dict() == {"Ana": 1, "Bia": 1}
+
+def test_atualizado_igual_ao_calculo_completo():
+    df = exemplo()
+    agregados = PlanoAgregados.calcular(df, HOJE)
+
+    novo = df.copy()
+    plano_schema.set_value(novo, 0, "Status", "Concluída")
+    plano_schema.set_value(novo, 2, "Responsável", "Caio")
+    plano_schema.set_value(novo, 3, "Término Previsto", "01/03/2025")
+    alteradas = [0, 2, 3]
+    adicionada = plano(com_prazo(8, "01/01/2025", responsavel="Caio"))
+    novo = pd.concat([novo.drop(index=[4]), adicionada], ignore_index=True)
+
+    incremental = agregados.atualizado(
+        df.loc[alteradas + [4]],
+        pd.concat([novo.iloc[[0, 2, 3]], adicionada]),
+    )
+    completo = PlanoAgregados.calcular(novo, HOJE)
+    for chave, serie in completo.contagens.items():
+        assert incremental.contagens[chave].sort_index().to_dict() == serie.sort_index().to_dict(), chave
+    # Valores zerados somem das contagens
+    assert "Encerrada" in incremental.contagens["Prazo"]
+    assert incremental.vencidas_por_responsavel().to_dict() == {"Ana": 1, "Bia": 1, "Caio": 1}
+
+def test_atualizado_sem_linhas():
+    agregados = PlanoAgregados.calcular(exemplo(), HOJE)
+    assert agregados.atualizado(None, None).contagens["Status"].to_dict() == agregados.contagens["Status"].to_dict()
+    vazio = PlanoAgregados.calcular(plano(), HOJE)
+    assert vazio.vencidas_por_responsavel().empty
@@ -0,0 +1,86 @@
+import pytest
+
+from exemplos import linha, novas_tarefas, planilha, plano
+from storage import CachedStorage, GoogleSheetsStorage, SQLiteStorage
+
+# --- append: numeração e caminho rápido ---
+
+def test_append_numera_a_partir_do_backend(backend):
+    a = CachedStorage(backend, check_interval=0)
+    b = CachedStorage(backend, check_interval=0)
+    a.snapshot()
+    b.snapshot()
+
+    assert b.append(novas_tarefas(1))["Nº Sequência"].tolist() == [4]
+    assert a.append(novas_tarefas(2))["Nº Sequência"].tolist() == [5, 6]
+    assert CachedStorage(backend).load()["Nº Sequência"].tolist() == [1, 2, 3, 4, 5, 6]
+
+def test_append_envia_so_as_linhas_novas():
+    worksheet = planilha(linha(1), linha(2))
+    storage = CachedStorage(GoogleSheetsStorage(lambda: worksheet))
+    storage.snapshot()
+    storage.append(novas_tarefas(2))
+
+    assert worksheet.calls["append_rows"] == 1
+    assert worksheet.calls["update"] == worksheet.calls["batch_update"] == 0
+    assert [row[0] for row in worksheet.values[1:]] == ["1", "2", "3", "4"]
+    assert storage.snapshot().df["Nº Sequência"].tolist() == [1, 2, 3, 4]
+
+# --- Versão do backend ---
+
+def test_versao_indisponivel_usa_ttl():
+    worksheet = planilha(linha(1))
+    aberturas = []
+    def abrir():
+        aberturas.append(1)
+        return worksheet
+    def falha():
+        raise RuntimeError("Drive API indisponível")
+    worksheet.spreadsheet.get_lastUpdateTime = falha
+    storage = CachedStorage(GoogleSheetsStorage(abrir), check_interval=0)
+
+    for _ in range(3):
+        storage.snapshot()
+    storage.save_cells({1: {"Observação": "x"}}, {1: {"Versão": 1, "Observação": None}})
+
+    assert len(aberturas) == 1
+    assert storage.misses == 1
+    assert worksheet.calls["batch_get"] == 2
+
+def test_cache_hit_sem_mudanca_de_versao(backend):
+    storage = CachedStorage(backend, check_interval=0)
+    storage.snapshot()
+    storage.save_cells({1: {"Observação": "x"}}, {1: {"Versão": 1, "Observação": None}})
+    # A versão avançou só pela nossa escrita: o cache continua valendo
+    storage.snapshot()
+    assert storage.misses == 1
+    assert storage.hits == 1
+
+@pytest.mark.parametrize("tipo", ["gsheets", "sqlite"])
+def test_escrita_alheia_durante_a_gravacao_marca_o_cache(tipo, tmp_path):
+    # Dois processos: cada um com o seu backend sobre a mesma planilha/banco
+    if tipo == "gsheets":
+        worksheet = planilha(linha(1), linha(2), linha(3))
+        backend, backend_outro = GoogleSheetsStorage(lambda: worksheet), GoogleSheetsStorage(lambda: worksheet)
+    else:
+        caminho = str(tmp_path / "planos.db")
+        backend = SQLiteStorage(caminho)
+        backend.save(plano(linha(1), linha(2), linha(3)), None)
+        backend_outro = SQLiteStorage(caminho)
+    storage = CachedStorage(backend, check_interval=0)
+    outro = CachedStorage(backend_outro, check_interval=0)
+    storage.snapshot()
+    outro.snapshot()
+
+    # O outro processo grava logo depois da nossa escrita, antes da leitura da versão
+    save_rows = backend.save_rows
+    def save_rows_com_concorrente(*args):
+        resultado = save_rows(*args)
+        outro.save_cells({2: {"Status": "Cancelada"}})
+        return resultado
+    backend.save_rows = save_rows_com_concorrente
+    storage.save_cells({1: {"Observação": "x"}}, {1: {"Versão": 1, "Observação": None}})
+
+    df = storage.load()
+    assert df.loc[1, "Status"] == "Cancelada"
+    assert df.loc[0, "Observação"] == "x"
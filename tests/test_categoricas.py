@@ -0,0 +1,42 @@
+import pandas as pd
+
+from exemplos import linha, novas_tarefas, plano
+from schema import STATUS_OPTIONS, TIPO_ACAO_OPTIONS, plano_schema
+from storage import CachedStorage, GoogleSheetsStorage, FakeWorksheet, SQLiteStorage
+
+def test_opcoes_fixas_primeiro_e_valores_extras_depois():
+    df = plano(linha(1, status="Pausada"), linha(2, responsavel="Zé"), linha(3, responsavel="Bia"))
+    assert list(df["Status"].cat.categories) == STATUS_OPTIONS + ["Pausada"]
+    assert list(df["Tipo Ação"].cat.categories) == TIPO_ACAO_OPTIONS
+    assert list(df["Responsável"].cat.categories) == ["Ana", "Bia", "Zé"]
+    assert df["Status"].tolist() == ["Pausada", "Planejada", "Planejada"]
+
+def test_concat_une_as_categorias():
+    df = plano_schema.concat([plano(linha(1)), novas_tarefas(1, responsavel="Caio")])
+    assert isinstance(df["Responsável"].dtype, pd.CategoricalDtype)
+    assert df["Responsável"].tolist() == ["Ana", "Caio"]
+
+def test_set_value_com_categoria_nova():
+    df = plano(linha(1))
+    assert plano_schema.set_value(df, 0, "Responsável", "Dani")
+    assert df["Responsável"].tolist() == ["Dani"]
+    assert "Dani" in df["Responsável"].cat.categories
+
+def ida_e_volta(backend):
+    storage = CachedStorage(backend)
+    storage.append(plano(linha("", status="Pausada"), linha("", responsavel="Zé", status="Concluída")))
+    storage.save_cells({2: {"Status": "Em Andamento", "Responsável": "Bia"}})
+    return CachedStorage(backend).load()
+
+def test_categoricas_ida_e_volta_no_google_sheets():
+    worksheet = FakeWorksheet([plano_schema.columns])
+    df = ida_e_volta(GoogleSheetsStorage(lambda: worksheet))
+    assert df["Status"].tolist() == ["Pausada", "Em Andamento"]
+    assert df["Responsável"].tolist() == ["Ana", "Bia"]
+    assert [row[10] for row in worksheet.values[1:]] == ["Pausada", "Em Andamento"]
+
+def test_categoricas_ida_e_volta_no_sqlite():
+    df = ida_e_volta(SQLiteStorage())
+    assert df["Status"].tolist() == ["Pausada", "Em Andamento"]
+    assert df["Responsável"].tolist() == ["Ana", "Bia"]
+    assert isinstance(df["Status"].dtype, pd.CategoricalDtype)
@@ -0,0 +1,58 @@
+from datetime import date
+
+import numpy as np
+
+from exemplos import linha, plano
+from filtros import PlanoFiltro, indice_texto, pagina, total_paginas
+from schema import plano_schema
+
+def exemplo():
+    df = plano(
+        linha(3, status="Concluída", inicio_previsto="10/03/2025"),
+        linha(1, inicio_previsto="01/02/2025"),
+        linha(2, status="Concluída"),
+        linha(4, inicio_previsto="20/03/2025"),
+    )
+    plano_schema.set_value(df, 0, "Observação", "Manutenção da bomba")
+    plano_schema.set_value(df, 3, "Descreva sua tarefa", "Trocar BOMBA d'água")
+    return df
+
+def test_sem_filtro_todas_em_ordem_de_numero():
+    filtro = PlanoFiltro()
+    assert not filtro.ativo()
+    assert list(filtro.posicoes(exemplo())) == [1, 2, 0, 3]
+
+def test_filtro_por_status_e_tipo():
+    df = exemplo()
+    assert list(PlanoFiltro(status=["Concluída"]).posicoes(df)) == [2, 0]
+    assert list(PlanoFiltro(tipos=["Ação Corretiva"]).posicoes(df)) == []
+
+def test_filtro_por_periodo():
+    df = exemplo()
+    filtro = PlanoFiltro(coluna_data="Início Previsto", inicio=date(2025, 3, 1), fim=date(2025, 3, 15))
+    assert list(filtro.posicoes(df)) == [0]
+    assert list(PlanoFiltro(coluna_data="Início Previsto", inicio=date(2025, 3, 1)).posicoes(df)) == [0, 3]
+
+def test_busca_sem_acentos_e_com_todos_os_termos():
+    df = exemplo()
+    texto = indice_texto(df)
+    assert list(PlanoFiltro(texto="bomba").posicoes(df, texto=texto)) == [0, 3]
+    assert list(PlanoFiltro(texto="manutencao bomba").posicoes(df, texto=texto)) == [0]
+    # Sem o índice pronto, a máscara calcula o texto na hora
+    assert list(PlanoFiltro(texto="MANUTENÇÃO").mascara(df)) == [True, False, False, False]
+
+def test_filtro_sobre_subconjunto_de_posicoes():
+    df = exemplo()
+    assert list(PlanoFiltro(status=["Concluída"]).posicoes(df, posicoes=[0, 1, 3])) == [0]
+
+def test_chave_identifica_o_filtro():
+    assert PlanoFiltro(status=["Concluída"], texto=" x ").chave() == PlanoFiltro(status=("Concluída",), texto="x").chave()
+    assert PlanoFiltro(status=["Concluída"]).chave() != PlanoFiltro().chave()
+
+def test_paginacao():
+    posicoes = np.arange(10)
+    assert total_paginas(0, 25) == 1
+    assert total_paginas(10, 4) == 3
+    assert list(pagina(posicoes, 1, 4)) == [0, 1, 2, 3]
+    assert list(pagina(posicoes, 3, 4)) == [8, 9]
+    assert list(pagina(posicoes, 4, 4)) == []
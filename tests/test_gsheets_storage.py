@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from exemplos import linha, planilha
+from schema import plano_schema
+from storage import CachedStorage, FakeWorksheet, GoogleSheetsStorage, _cell_updates
+
+def coluna(worksheet, nome):
+    return [row[plano_schema.columns.index(nome)] if len(row) > plano_schema.columns.index(nome) else ''
+            for row in worksheet.values[1:]]
+
+# --- Gravação só das células alteradas ---
+
+def test_cell_updates_um_range_por_trecho_contiguo():
+    valores = np.array([list("abcdefghijklm")], dtype=object)
+    alterado = np.zeros((1, 13), dtype=bool)
+    alterado[0, [6, 7, 12]] = True
+    assert _cell_updates(valores, alterado, [0]) == [
+        {'range': 'G2:H2', 'values': [['g', 'h']]},
+        {'range': 'M2:M2', 'values': [['m']]},
+    ]
+
+def test_save_envia_um_batch_update():
+    worksheet = planilha(linha(1), linha(2), linha(3))
+    storage = CachedStorage(GoogleSheetsStorage(lambda: worksheet))
+    df = storage.load()
+    df.loc[1, "Observação"] = "x"
+    storage.save(df)
+
+    assert worksheet.calls["batch_update"] == 1
+    assert worksheet.calls["update"] == 0
+    assert coluna(worksheet, "Observação") == ["", "x", ""]
+
+def test_edicao_nao_regrava_celulas_fora_do_formato():
+    worksheet = planilha(linha(1, termino_real="01/02/2025 10:00"))
+    storage = CachedStorage(GoogleSheetsStorage(lambda: worksheet))
+    storage.save_cells({1: {"Início Previsto": pd.Timestamp("2025-03-01")}}, {1: {"Versão": 1, "Início Previsto": pd.NaT}})
+    assert coluna(worksheet, "Término Real") == ["01/02/2025 10:00"]
+    assert coluna(worksheet, "Início Previsto") == ["01/03/2025"]
+
+# --- Reescrita completa ---
+
+def test_reescrita_completa_limpa_linhas_abaixo():
+    # Uma linha vazia no meio obriga a reescrever a planilha inteira
+    worksheet = planilha(linha(1), [], linha(2), linha(3))
+    storage = CachedStorage(GoogleSheetsStorage(lambda: worksheet))
+    df = storage.load()
+    df.loc[0, "Observação"] = "x"
+    storage.save(df)
+    assert CachedStorage(GoogleSheetsStorage(lambda: worksheet)).load()["Nº Sequência"].tolist() == [1, 2, 3]
+
+# --- FakeWorksheet ---
+
+def test_fake_get_all_values_retangular_como_o_gspread():
+    worksheet = planilha(linha(1)[:12], linha(2), [], [""] * 13)
+    valores = worksheet.get_all_values()
+    assert len(valores) == 3
+    assert {len(row) for row in valores} == {13}
+    assert valores[1][12] == ""
+
+def test_fake_conta_chamadas_e_simula_429():
+    worksheet = planilha(linha(1))
+    worksheet.rate_limit_errors = 1
+    try:
+        worksheet.batch_update([{'range': 'L2:L2', 'values': [['x']]}])
+    except Exception as e:
+        assert e.code == 429
+    worksheet.batch_update([{'range': 'L2:L2', 'values': [['x']]}])
+    assert worksheet.calls["rate_limited"] == 1
+    assert worksheet.calls["batch_update"] == 1
+    assert worksheet.values[1][11] == "x"
+    assert worksheet.revision == 1
+
+def test_planilha_sem_versao_preserva_datas_fora_do_formato():
+    # Planilha antiga, sem a coluna Versão: o primeiro save reescreve tudo
+    worksheet = FakeWorksheet([plano_schema.columns[:12], linha(1, inicio_previsto="05/03/25")[:12], linha(2)[:12]])
+    storage = CachedStorage(GoogleSheetsStorage(lambda: worksheet))
+    storage.save_cells({1: {"Status": "Concluída"}})
+    assert worksheet.values[0] == plano_schema.columns
+    assert coluna(worksheet, "Início Previsto") == ["05/03/2025", ""]
+    assert coluna(worksheet, "Status") == ["Concluída", "Planejada"]
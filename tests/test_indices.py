@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+from exemplos import linha, novas_tarefas, planilha, plano
+from indices import PlanoIndex, posicoes_por_seq
+from schema import plano_schema
+from snapshot import SessionOverlay
+from storage import CachedStorage, GoogleSheetsStorage
+
+def por_responsavel(indice):
+    return {nome: list(indice.posicoes_responsavel(nome)) for nome in indice.responsaveis()}
+
+def test_posicoes_e_responsaveis():
+    indice = PlanoIndex(plano(linha(3, "Bia"), linha(1, "Ana"), linha(2, "Bia")))
+    assert list(indice.posicoes([1, 2, 3, 9])) == [1, 2, 0, -1]
+    assert indice.responsaveis() == ["Ana", "Bia"]
+    # Posições de cada responsável em ordem de Nº Sequência
+    assert por_responsavel(indice) == {"Ana": [1], "Bia": [2, 0]}
+
+def test_posicoes_por_seq_com_repetidos():
+    seqs = pd.Index([1, 2, 2, 3], dtype='Int64')
+    assert list(posicoes_por_seq(seqs, [2, 3, 4])) == [1, 3, -1]
+
+def test_mover_responsavel_mantem_a_ordem_de_numero():
+    df = plano(linha(5, "Ana"), linha(3, "Ana"), linha(2, "Bia"), linha(4, "Ana"))
+    indice = PlanoIndex(df)
+    assert por_responsavel(indice) == {"Ana": [1, 3, 0], "Bia": [2]}
+
+    indice.mover_responsavel(2, "Bia", "Ana")
+    assert por_responsavel(indice) == {"Ana": [2, 1, 3, 0]}
+
+def test_atualizado_igual_ao_indice_recalculado():
+    df = plano(linha(5, "Ana"), linha(3, "Ana"), linha(2, "Bia"), linha(4, "Caio"))
+    indice = PlanoIndex(df)
+    novo_df = plano_schema.concat([df, novas_tarefas(2, responsavel="Bia")])
+    novo_df.loc[4:, "Nº Sequência"] = [6, 1]
+    plano_schema.set_value(novo_df, 3, "Responsável", "Ana")
+    plano_schema.set_value(novo_df, 2, "Responsável", "Caio")
+    posicoes = np.array([2, 3])
+
+    atualizado = indice.atualizado(posicoes, df.iloc[posicoes], novo_df.iloc[posicoes], novo_df.iloc[len(df):])
+    assert por_responsavel(atualizado) == por_responsavel(PlanoIndex(novo_df))
+    # O índice anterior continua valendo para o snapshot anterior
+    assert por_responsavel(indice) == {"Ana": [1, 0], "Bia": [2], "Caio": [3]}
+
+def test_atualizado_com_numero_alterado_recalcula():
+    df = plano(linha(1), linha(2))
+    novo_df = df.copy()
+    novo_df.loc[1, "Nº Sequência"] = 7
+    assert PlanoIndex(df).atualizado(np.array([1]), df.iloc[[1]], novo_df.iloc[[1]], novo_df.iloc[2:]) is None
+
+# --- Nº Sequência repetido ou vazio ---
+
+def test_numero_de_sequencia_repetido():
+    worksheet = planilha(linha(1), linha(2, responsavel="Ana"), linha(2, responsavel="Bia"), linha(3))
+    storage = CachedStorage(GoogleSheetsStorage(lambda: worksheet))
+    plano_atual = storage.snapshot()
+
+    assert list(plano_atual.indice.posicoes([2, 3, 9])) == [1, 3, -1]
+    assert plano_atual.indice.repetidos() == {2}
+
+    overlay = SessionOverlay()
+    overlay.aplicar({2: {"Observação": "x"}, 3: {"Observação": None}})
+    overlay.descartar_salvas(plano_atual)
+    assert overlay.edits == {2: {"Observação": "x"}}
+
+    assert storage.save_cells({3: {"Observação": "ok"}}, {3: {"Versão": 1, "Observação": None}}) == []
+    assert worksheet.values[4][plano_schema.columns.index("Observação")] == "ok"
+
+def test_numero_de_sequencia_vazio():
+    worksheet = planilha(linha(1), linha(""), linha(3))
+    storage = CachedStorage(GoogleSheetsStorage(lambda: worksheet))
+    plano_atual = storage.snapshot()
+
+    assert plano_atual.df["Nº Sequência"].isna().tolist() == [False, True, False]
+    assert list(plano_atual.indice.posicoes([3])) == [2]
+    assert por_responsavel(plano_atual.indice) == {"Ana": [0, 2, 1]}
+    assert storage.save_cells({3: {"Status": "Concluída"}}, {3: {"Versão": 1, "Status": "Planejada"}}) == []
+    assert storage.append(novas_tarefas(1))["Nº Sequência"].tolist() == [4]
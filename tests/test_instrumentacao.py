@@ -0,0 +1,82 @@
+import json
+import logging
+
+import pytest
+
+from exemplos import linha, planilha
+from instrumentacao import InstrumentedProxy, SessaoMetricas, api_stats
+
+def chamadas(metodo):
+    return api_stats.resumo().get(metodo, {"chamadas": 0, "erros": 0})
+
+def test_proxy_mede_so_os_metodos_da_api():
+    worksheet = planilha(linha(1))
+    proxy = InstrumentedProxy(worksheet)
+    antes = chamadas("get_all_values")
+
+    assert proxy.get_all_values() == worksheet.values
+    assert proxy.title == "Planos"
+    assert proxy.row_count == 2
+    assert chamadas("get_all_values")["chamadas"] == antes["chamadas"] + 1
+    assert isinstance(proxy.spreadsheet, InstrumentedProxy)
+
+def test_proxy_conta_os_erros():
+    worksheet = planilha(linha(1))
+    worksheet.rate_limit_errors = 1
+    proxy = InstrumentedProxy(worksheet)
+    antes = chamadas("update")
+
+    with pytest.raises(Exception):
+        proxy.update([["x"]], "L2")
+    proxy.update([["x"]], "L2")
+    depois = chamadas("update")
+    assert depois["chamadas"] == antes["chamadas"] + 2
+    assert depois["erros"] == antes["erros"] + 1
+
+def test_rerun_registra_spans_api_e_cache(caplog):
+    metricas = SessaoMetricas("s1")
+    proxy = InstrumentedProxy(planilha(linha(1)))
+
+    trace = metricas.iniciar()
+    with metricas.span("filtros"):
+        proxy.get_all_values()
+    metricas.marcar("tabela")
+    metricas.registrar_cache(2, 1)
+    with caplog.at_level(logging.INFO, logger="plano.instrumentacao"):
+        metricas.finalizar()
+
+    assert [span["nome"] for span in trace.spans] == ["filtros", "tabela"]
+    assert [chamada["metodo"] for chamada in trace.api] == ["get_all_values"]
+    assert trace.cache == {"hits": 2, "misses": 1}
+    assert trace.duracao_ms is not None and not trace.interrompido
+    assert list(metricas.historico) == [trace]
+    resumo = json.loads(caplog.records[-1].getMessage())
+    assert resumo["sessao"] == "s1" and resumo["api_chamadas"] == 1
+
+def test_chamadas_fora_do_rerun_nao_entram_no_trace():
+    metricas = SessaoMetricas("s1")
+    proxy = InstrumentedProxy(planilha(linha(1)))
+    trace = metricas.iniciar()
+    metricas.finalizar()
+    proxy.get_all_values()
+    assert trace.api == []
+
+def test_rerun_interrompido_e_spans_de_callback():
+    metricas = SessaoMetricas("s1", historico=2)
+    primeiro = metricas.iniciar()
+    # st.rerun(): o script para antes do finalizar()
+    with metricas.span("salvar"):
+        pass
+    segundo = metricas.iniciar()
+
+    assert primeiro.interrompido and primeiro.duracao_ms is not None
+    assert segundo.spans == [] and not segundo.interrompido
+    metricas.finalizar()
+
+    # Callback de widget, antes do script do próximo rerun
+    with metricas.span("editor"):
+        pass
+    terceiro = metricas.iniciar()
+    assert [span["nome"] for span in terceiro.spans] == ["editor (callback)"]
+    metricas.finalizar()
+    assert list(metricas.historico) == [segundo, terceiro]
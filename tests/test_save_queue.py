@@ -0,0 +1,98 @@
+import time
+
+from save_queue import FALHOU, PENDENTE, SALVO, SaveQueue
+from schema import plano_schema
+from storage import CachedStorage, FakeWorksheet, GoogleSheetsStorage
+
+def worksheet_com_tarefa():
+    return FakeWorksheet([
+        plano_schema.columns,
+        ["1", "01/01/2025", "Ana", "Tarefa", "Ação", "Ação Imediata", "", "", "", "", "Planejada", "", "1"],
+    ])
+
+def queue(**kwargs):
+    return SaveQueue(**{"debounce": 0.01, "max_delay": 0.05, "base_backoff": 0.01, "max_backoff": 0.02, **kwargs})
+
+def test_coalesce_edicoes_da_mesma_celula():
+    lotes = []
+    fila = queue(debounce=0.2, max_delay=1.0)
+    flush = lambda edits, bases: lotes.append((edits, bases)) or []
+    fila.submit("k", {1: {"Status": "Em Andamento"}}, flush, {1: {"Versão": 1, "Status": "Planejada"}})
+    fila.submit("k", {1: {"Status": "Concluída"}, 2: {"Observação": "x"}}, flush, {1: {"Versão": 1, "Status": "Em Andamento"}})
+    assert fila.status("k")[0] == PENDENTE
+    assert fila.wait(timeout=5)
+
+    assert lotes == [(
+        {1: {"Status": "Concluída"}, 2: {"Observação": "x"}},
+        {1: {"Versão": 1, "Status": "Planejada"}},
+    )]
+    assert fila.status("k") == (SALVO, None)
+
+def test_429_tenta_de_novo_com_backoff():
+    worksheet = worksheet_com_tarefa()
+    worksheet.rate_limit_errors = 2
+    storage = CachedStorage(GoogleSheetsStorage(lambda: worksheet))
+    fila = queue()
+
+    fila.submit("k", {1: {"Observação": "x"}}, storage.save_cells, {1: {"Versão": 1, "Observação": None}})
+    assert fila.wait(timeout=5)
+
+    assert worksheet.calls["rate_limited"] == 2
+    assert worksheet.calls["batch_update"] == 1
+    assert fila.status("k") == (SALVO, None)
+    assert storage.load().loc[0, "Observação"] == "x"
+
+def test_429_desiste_depois_de_max_attempts_e_permite_reenvio():
+    worksheet = worksheet_com_tarefa()
+    worksheet.rate_limit_errors = 3
+    storage = CachedStorage(GoogleSheetsStorage(lambda: worksheet))
+    fila = queue(max_attempts=2)
+
+    fila.submit("k", {1: {"Observação": "x"}}, storage.save_cells)
+    assert fila.wait(timeout=5)
+    assert fila.status("k")[0] == FALHOU
+
+    worksheet.rate_limit_errors = 0
+    fila.retry_failed("k")
+    assert fila.wait(timeout=5)
+    assert fila.status("k") == (SALVO, None)
+    assert storage.load().loc[0, "Observação"] == "x"
+
+def test_outros_erros_falham_sem_nova_tentativa():
+    chamadas = []
+    def flush(edits, bases):
+        chamadas.append(edits)
+        raise RuntimeError("sem permissão")
+    fila = queue()
+    fila.submit("k", {1: {"Observação": "x"}}, flush)
+    assert fila.wait(timeout=5)
+    assert len(chamadas) == 1
+    assert fila.status("k") == (FALHOU, "sem permissão")
+
+def test_conflitos_ficam_disponiveis_ate_serem_dispensados():
+    conflito = {"Nº Sequência": 1, "coluna": "Status", "seu valor": "Cancelada", "valor atual": "Concluída"}
+    fila = queue()
+    fila.submit("k", {1: {"Status": "Cancelada"}}, lambda edits, bases: [conflito])
+    assert fila.wait(timeout=5)
+    assert fila.conflitos("k") == [conflito]
+    fila.limpar_conflitos("k")
+    assert fila.conflitos("k") == []
+
+def test_rerun_nao_espera_a_gravacao_em_andamento():
+    worksheet = worksheet_com_tarefa()
+    storage = CachedStorage(GoogleSheetsStorage(lambda: worksheet), check_interval=0)
+    plano = storage.snapshot()
+    worksheet.latency = 0.3
+    fila = queue()
+
+    fila.submit("k", {1: {"Observação": "x"}}, storage.save_cells, {1: {"Versão": 1, "Observação": None}})
+    while not fila._in_flight:
+        time.sleep(0.005)
+    time.sleep(0.05)  # o worker já está com o lock, esperando a API
+    inicio = time.monotonic()
+    assert storage.snapshot() is plano
+    assert time.monotonic() - inicio < 0.1
+
+    assert fila.wait(timeout=10)
+    worksheet.latency = 0
+    assert storage.snapshot().df.loc[0, "Observação"] == "x"
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from exemplos import linha, plano
+from schema import plano_schema
+
+def test_coerce_aplica_os_dtypes_do_schema():
+    df = plano(linha(1, inicio_previsto="05/03/2025"), linha(2))
+    assert list(df.columns) == plano_schema.columns
+    for col in plano_schema.int_columns:
+        assert df[col].dtype == 'Int64'
+    for col in plano_schema.date_columns:
+        assert df[col].dtype == 'datetime64[ns]'
+    for col in plano_schema.categories:
+        assert isinstance(df[col].dtype, pd.CategoricalDtype)
+    assert df["Nº Sequência"].tolist() == [1, 2]
+    assert df["Início Previsto"].tolist()[0] == pd.Timestamp("2025-03-05")
+    assert pd.isna(df["Início Previsto"].iloc[1])
+
+def test_coerce_nao_transforma_vazio_em_nan_texto():
+    df = plano(linha(1))
+    assert pd.isna(df["Observação"].iloc[0])
+    assert plano_schema.format_for_gsheets(df)["Observação"].tolist() == [""]
+
+def test_coerce_de_frame_ja_tipado_nao_muda_nada():
+    df = plano(linha(1), linha(2))
+    assert plano_schema.coerce(df.copy()).equals(df)
+
+def test_coerce_cria_colunas_que_faltam_na_ordem_do_schema():
+    df = plano_schema.coerce(pd.DataFrame({"Status": ["Planejada"], "Nº Sequência": ["7"]}))
+    assert list(df.columns) == plano_schema.columns
+    assert df["Nº Sequência"].tolist() == [7]
+    assert pd.isna(df["Versão"].iloc[0])
+
+def test_numero_invalido_vira_vazio():
+    df = plano_schema.coerce(pd.DataFrame({"Nº Sequência": ["1", "x", None]}))
+    assert df["Nº Sequência"].isna().tolist() == [False, True, True]
+
+def test_datas_fora_do_formato_sao_preservadas():
+    datas = plano_schema._parse_dates(pd.Series(["05/03/2025", "05/03/25", "01/02/2025 10:00", None, "lixo"], dtype=object))
+    assert list(pd.DatetimeIndex(datas).strftime("%d/%m/%Y %H:%M").fillna("")) == [
+        "05/03/2025 00:00", "05/03/2025 00:00", "01/02/2025 10:00", "", "",
+    ]
+
+def test_format_for_gsheets_ida_e_volta():
+    linhas = [linha(1, inicio_previsto="05/03/2025", termino_real="10/03/2025"), linha(2, versao="")]
+    df = plano(*linhas)
+    formatado = plano_schema.format_for_gsheets(df)
+    assert [[str(valor) for valor in row] for row in formatado.to_numpy().tolist()] == linhas
+
+def test_set_value_informa_se_mudou():
+    df = plano(linha(1))
+    assert not plano_schema.set_value(df, 0, "Observação", "")
+    assert plano_schema.set_value(df, 0, "Observação", "nova")
+    assert df["Observação"].iloc[0] == "nova"
+    assert not plano_schema.same_value(np.nan, "x")
+    assert plano_schema.same_value(pd.NaT, "")
+
+def test_copy_columns_nao_altera_o_original():
+    df = plano(linha(1))
+    copia = plano_schema.copy_columns(df, ["Observação"])
+    plano_schema.set_value(copia, 0, "Observação", "x")
+    assert pd.isna(df["Observação"].iloc[0])
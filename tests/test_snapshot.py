@@ -0,0 +1,95 @@
+from datetime import date
+
+import numpy as np
+
+from exemplos import linha, planilha
+from filtros import PlanoFiltro
+from snapshot import SessionOverlay
+from storage import CachedStorage, GoogleSheetsStorage
+
+HOJE = date(2025, 1, 1)
+
+def plano_de(*linhas):
+    worksheet = planilha(*linhas)
+    return CachedStorage(GoogleSheetsStorage(lambda: worksheet)).snapshot()
+
+def test_frame_aplica_as_edicoes_so_na_copia():
+    plano = plano_de(linha(1), linha(2), linha(3))
+    overlay = SessionOverlay()
+    overlay.aplicar({2: {"Status": "Concluída"}})
+
+    frame = overlay.frame(plano, np.array([2, 1]))
+    assert frame["Nº Sequência"].tolist() == [3, 2]
+    assert frame["Status"].tolist() == ["Planejada", "Concluída"]
+    assert plano.df["Status"].tolist() == ["Planejada"] * 3
+
+def test_frame_com_linha_sem_numero():
+    plano = plano_de(linha(1), linha(""), linha(3))
+    overlay = SessionOverlay()
+    overlay.aplicar({3: {"Observação": "x"}})
+
+    frame = overlay.frame(plano, np.arange(3))
+    assert frame["Observação"].isna().tolist() == [True, True, False]
+    assert frame["Observação"].iloc[2] == "x"
+
+def test_revisao_muda_a_cada_alteracao():
+    overlay = SessionOverlay()
+    revisoes = [overlay.revisao]
+    overlay.aplicar({1: {"Status": "Concluída"}})
+    revisoes.append(overlay.revisao)
+    overlay.limpar()
+    revisoes.append(overlay.revisao)
+    overlay.limpar()
+    revisoes.append(overlay.revisao)
+    assert revisoes == [0, 1, 2, 2]
+    assert len(overlay) == 0
+
+def test_filtrar_reavalia_as_linhas_editadas():
+    plano = plano_de(linha(1), linha(2, status="Concluída"), linha(3))
+    overlay = SessionOverlay()
+    overlay.aplicar({1: {"Status": "Concluída"}, 2: {"Status": "Em Andamento"}})
+    filtro = PlanoFiltro(status=["Concluída"])
+
+    posicoes = filtro.posicoes(plano.df)
+    assert list(posicoes) == [1]
+    assert list(overlay.filtrar(plano, filtro, posicoes)) == [0]
+    # Com uma base (ex.: tarefas de um responsável), só as editadas dentro dela
+    assert list(overlay.filtrar(plano, filtro, filtro.posicoes(plano.df, [1, 2]), base=[1, 2])) == []
+
+def test_agregados_com_edicoes_pendentes():
+    plano = plano_de(linha(1), linha(2), linha(3, responsavel="Bia"))
+    overlay = SessionOverlay()
+    assert overlay.agregados(plano, HOJE) is plano.agregados(HOJE)
+
+    overlay.aplicar({3: {"Status": "Concluída"}})
+    agregados = overlay.agregados(plano, HOJE)
+    assert agregados.contagem("Status").to_dict() == {"Planejada": 2, "Concluída": 1}
+    assert plano.agregados(HOJE).contagem("Status").to_dict() == {"Planejada": 3}
+
+def test_descartar_salvas():
+    storage = CachedStorage(GoogleSheetsStorage(lambda: worksheet))
+    worksheet = planilha(linha(1), linha(2))
+    overlay = SessionOverlay()
+    overlay.aplicar({1: {"Observação": "x"}, 2: {"Observação": "y"}, 9: {"Observação": "z"}})
+    storage.save_cells({1: {"Observação": "x"}})
+
+    revisao = overlay.revisao
+    overlay.descartar_salvas(storage.snapshot())
+    assert overlay.edits == {2: {"Observação": "y"}}
+    assert overlay.revisao == revisao + 1
+
+def test_snapshot_publicado_nao_e_alterado(backend):
+    storage = CachedStorage(backend)
+    anterior = storage.snapshot()
+    anterior.indice, anterior.texto, anterior.agregados(HOJE)
+    storage.save_cells({1: {"Status": "Concluída", "Observação": "bomba"}}, {1: {"Versão": 1, "Status": "Planejada"}})
+
+    atual = storage.snapshot()
+    assert anterior.df["Status"].tolist() == ["Planejada"] * 3
+    assert anterior.df["Versão"].tolist() == [1, 1, 1]
+    assert anterior.agregados(HOJE).contagem("Status").to_dict() == {"Planejada": 3}
+    assert atual.df["Status"].tolist() == ["Concluída", "Planejada", "Planejada"]
+    # Índices e agregados herdados só com a linha alterada
+    assert atual.agregados(HOJE).contagem("Status").to_dict() == {"Planejada": 2, "Concluída": 1}
+    assert list(PlanoFiltro(texto="bomba").posicoes(atual.df, texto=atual.texto)) == [0]
+    assert list(atual.indice.posicoes([1, 2, 3])) == [0, 1, 2]
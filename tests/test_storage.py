@@ -0,0 +1,44 @@
+from storage import CachedStorage
+
+# --- save_cells: controle otimista ---
+
+def test_edicao_concorrente_sem_conflito(backend):
+    a = CachedStorage(backend, check_interval=0)
+    b = CachedStorage(backend, check_interval=0)
+    a.snapshot()
+    b.snapshot()
+
+    assert b.save_cells({1: {"Status": "Concluída"}}, {1: {"Versão": 1, "Status": "Planejada"}}) == []
+    # a ainda vê a Versão 1, mas edita outra coluna: as duas edições ficam
+    assert a.save_cells({1: {"Observação": "ok"}}, {1: {"Versão": 1, "Observação": None}}) == []
+
+    df = CachedStorage(backend).load()
+    assert df.loc[0, "Status"] == "Concluída"
+    assert df.loc[0, "Observação"] == "ok"
+    assert df.loc[0, "Versão"] == 3
+
+def test_edicao_concorrente_com_conflito(backend):
+    a = CachedStorage(backend, check_interval=0)
+    b = CachedStorage(backend, check_interval=0)
+    a.snapshot()
+    b.snapshot()
+
+    b.save_cells({2: {"Status": "Concluída"}}, {2: {"Versão": 1, "Status": "Planejada"}})
+    conflitos = a.save_cells({2: {"Status": "Cancelada"}}, {2: {"Versão": 1, "Status": "Planejada"}})
+
+    assert conflitos == [{"Nº Sequência": 2, "coluna": "Status", "seu valor": "Cancelada", "valor atual": "Concluída"}]
+    assert CachedStorage(backend).load().loc[1, "Status"] == "Concluída"
+
+def test_mesmo_valor_nao_e_conflito(backend):
+    a = CachedStorage(backend, check_interval=0)
+    b = CachedStorage(backend, check_interval=0)
+    a.snapshot()
+    b.snapshot()
+
+    b.save_cells({2: {"Status": "Concluída"}}, {2: {"Versão": 1, "Status": "Planejada"}})
+    assert a.save_cells({2: {"Status": "Concluída"}}, {2: {"Versão": 1, "Status": "Planejada"}}) == []
+
+def test_edicao_de_tarefa_removida(backend):
+    storage = CachedStorage(backend)
+    conflitos = storage.save_cells({99: {"Status": "Concluída"}}, {99: {"Versão": 1}})
+    assert conflitos == [{"Nº Sequência": 99, "coluna": None, "seu valor": None, "valor atual": None}]
@@ -0,0 +1,85 @@
+import pytest
+
+from exemplos import linha, novas_tarefas, planilha, plano
+from schema import plano_schema
+from storage import CachedStorage, FakeWorksheet, GoogleSheetsStorage, SQLiteStorage
+
+@pytest.fixture(params=["gsheets", "sqlite"])
+def dois_backends(request, tmp_path):
+    # Dois processos: cada um com o seu backend sobre a mesma planilha/banco
+    if request.param == "gsheets":
+        worksheet = planilha(linha(1), linha(2), linha(3))
+        return GoogleSheetsStorage(lambda: worksheet), GoogleSheetsStorage(lambda: worksheet)
+    caminho = str(tmp_path / "planos.db")
+    backend = SQLiteStorage(caminho)
+    backend.save(plano(linha(1), linha(2), linha(3)), None)
+    return backend, SQLiteStorage(caminho)
+
+def test_load_changes_linhas_alteradas_e_novas(dois_backends):
+    backend, backend_outro = dois_backends
+    _, snapshot = backend.load()
+    outro = CachedStorage(backend_outro)
+    outro.save_cells({2: {"Status": "Concluída"}})
+    outro.append(novas_tarefas(2))
+
+    posicoes, alteradas, novas = backend.load_changes(snapshot)
+    assert list(posicoes) == [1]
+    assert alteradas["Nº Sequência"].tolist() == [2]
+    assert alteradas["Status"].tolist() == ["Concluída"]
+    assert alteradas["Versão"].tolist() == [2]
+    assert novas["Nº Sequência"].tolist() == [4, 5]
+    assert novas["Responsável"].tolist() == ["Bia", "Bia"]
+
+def test_load_changes_sem_mudancas(backend):
+    _, snapshot = backend.load()
+    posicoes, alteradas, novas = backend.load_changes(snapshot)
+    assert len(posicoes) == 0 and alteradas.empty and novas.empty
+
+def test_load_changes_linha_removida_pede_releitura():
+    worksheet = planilha(linha(1), linha(2), linha(3))
+    backend = GoogleSheetsStorage(lambda: worksheet)
+    _, snapshot = backend.load()
+    del worksheet.values[2]
+    assert backend.load_changes(snapshot) is None
+
+def test_load_changes_cabecalho_diferente_pede_releitura():
+    worksheet = planilha(linha(1), linha(2))
+    backend = GoogleSheetsStorage(lambda: worksheet)
+    _, snapshot = backend.load()
+    worksheet.values[0] = worksheet.values[0][:12]
+    assert backend.load_changes(snapshot) is None
+
+def test_sync_incremental_mescla_no_cache(dois_backends, monkeypatch):
+    backend, backend_outro = dois_backends
+    storage = CachedStorage(backend, check_interval=0)
+    anterior = storage.snapshot()
+    load = backend.load
+    monkeypatch.setattr(backend, "load", lambda: pytest.fail("releitura completa"))
+    outro = CachedStorage(backend_outro)
+    outro.save_cells({3: {"Observação": "x"}})
+    outro.append(novas_tarefas(1))
+
+    atual = storage.snapshot()
+    assert atual is not anterior
+    assert atual.df["Nº Sequência"].tolist() == [1, 2, 3, 4]
+    assert atual.df["Observação"].tolist()[2] == "x"
+    assert anterior.df["Observação"].isna().all()
+    # O plano mesclado é igual ao de uma releitura completa
+    completo, _ = load()
+    assert plano_schema.format_for_gsheets(atual.df).equals(plano_schema.format_for_gsheets(completo))
+
+class PlanilhaIrregular(FakeWorksheet):
+    # get_all_values sem completar as linhas até a mesma largura
+    def get_all_values(self, **kwargs):
+        self._record("get_all_values")
+        return [list(row) for row in self.values]
+
+@pytest.mark.parametrize("tipo", [FakeWorksheet, PlanilhaIrregular])
+def test_planilha_sem_versao_com_linha_mais_longa(tipo):
+    # Append feito com 13 colunas numa planilha antiga, de 12: o load não quebra
+    worksheet = tipo([plano_schema.columns[:12], linha(1)[:12]])
+    worksheet.append_rows([linha(2)])
+    df, snapshot = GoogleSheetsStorage(lambda: worksheet).load()
+    assert df["Nº Sequência"].tolist() == [1, 2]
+    assert list(df.columns) == plano_schema.columns
+    assert snapshot is None